@@ -7,8 +7,19 @@ import platform
 import subprocess
 import shutil
 import ctypes
+import asyncio
 
-from converter.document_converter import CONVERSION_MAP
+from converter.document_converter import CONVERSION_MAP, set_office_workers, parse_targets
+from converter.raster import RasterOptions, RASTER_PRESETS, RASTER_FORMATS, BLANK_PAGE_MODES
+from converter.thumbnails import build_sprite_sheet
+from converter.batch_collector import collect_batch
+from converter.archive import ARCHIVE_FORMATS
+from converter.pdf_optimize import PDF_OPTIMIZE_PRESETS
+from converter.admission import parse_memory, default_memory_budget
+from converter.estimate import ThroughputStats, estimate_jobs, format_plan
+from converter import tracing
+from converter.sandbox import SandboxExecutor, SandboxLimits
+from converter.async_converter import convert_jobs_async, shutdown_executor
 
 # Setup Logger
 LOG_FILE = os.path.join(tempfile.gettempdir(), "liteswitch.log")
@@ -18,6 +29,9 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Set by --quiet: messages go to the console instead of a dialog that waits for a click
+QUIET = False
+
 def show_linux_message(title, msg, is_error=False):
     """Show a GUI message on Linux using Zenity or Kdialog."""
     # Try Zenity (GNOME/GTK)
@@ -37,6 +51,9 @@ def show_linux_message(title, msg, is_error=False):
 
 def show_message(title, msg, is_error=False):
     """Show a GUI message box using ctypes (Windows) or Zenity/Kdialog (Linux)."""
+    if QUIET:
+        print(f"[{title}] {msg}")
+        return
     if platform.system() == "Windows":
         # 0x40 = MB_ICONINFORMATION, 0x10 = MB_ICONERROR, 0x0 = MB_OK, 0x40000 = MB_TOPMOST
         flags = 0x0 | 0x40000
@@ -54,12 +71,153 @@ def show_message(title, msg, is_error=False):
         # Linux/macOS
         show_linux_message(title, msg, is_error)
 
+def raster_options_from_args(args) -> RasterOptions:
+    """Builds RasterOptions from --raster-preset plus any individual raster flags."""
+    preset = RASTER_PRESETS[args.raster_preset]
+    overrides = RasterOptions(
+        dpi=args.dpi,
+        max_pixels=args.max_pixels,
+        fmt=args.image_format,
+        quality=args.quality,
+        compression=args.compression,
+        grayscale=args.grayscale or None,
+        alpha=args.alpha or None,
+    )
+    return overrides.merged(preset)
+
+def parse_size(value: str):
+    """'256' or '320x180' -> (width, height)."""
+    try:
+        parts = [int(p) for p in value.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value}")
+    if len(parts) == 1:
+        parts *= 2
+    if len(parts) != 2 or min(parts) <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value}")
+    return tuple(parts)
+
+def parse_positive(value: str) -> float:
+    """A number above zero (argparse type, e.g. --dpi)."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a number: {value}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Must be positive: {value}")
+    return number
+
+def parse_count(value: str) -> int:
+    """A whole number above zero (argparse type, e.g. --max-pixels, --thumbnail-pages)."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a whole number: {value}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Must be positive: {value}")
+    return number
+
+def parse_quality(value: str) -> int:
+    """1-100 (argparse type, --quality)."""
+    try:
+        quality = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a whole number: {value}")
+    if not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError(f"Quality must be between 1 and 100: {value}")
+    return quality
+
+def parse_budget(value: str) -> int:
+    """'6G' -> bytes (argparse type)."""
+    try:
+        return parse_memory(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def sandbox_executor_from_args(args, jobs: int):
+    """A SandboxExecutor if --sandbox or any of its limits was given, else None (the shared pool)."""
+    if not args.sandbox and args.job_memory is None and args.job_cpu is None and args.job_timeout is None:
+        return None
+
+    def pick(value, default):
+        # Unset: the default; 0: no limit
+        return default if value is None else (value or None)
+
+    defaults = SandboxLimits()
+    limits = SandboxLimits(memory=pick(args.job_memory, defaults.memory),
+                           cpu_seconds=pick(args.job_cpu, defaults.cpu_seconds),
+                           timeout=pick(args.job_timeout, defaults.timeout))
+    return SandboxExecutor(limits, max_workers=jobs)
+
 def main():
+    global QUIET
     parser = argparse.ArgumentParser(description="LiteSwitch File Converter")
     parser.add_argument("input_files", nargs='+', help="Path to the input file(s)")
-    parser.add_argument("--to", required=False, help="Target format extension (e.g. pdf, docx)")
+    parser.add_argument("--to", required=False, help="Target format extension (e.g. pdf, docx), or several "
+                             "separated by commas (e.g. png,txt,md)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of files converted concurrently (default: CPU count)")
+    parser.add_argument("--memory-budget", type=parse_budget, metavar="SIZE",
+                        help="Start a file only while the estimated memory of running conversions "
+                             "fits in SIZE (e.g. 6G; default: 75%% of available RAM; 0 disables)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Print the result instead of showing a message box; exit with 1 if any file failed")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Print the predicted time, peak memory and output size of each file and of "
+                             "the batch, then exit without converting")
+    parser.add_argument("--no-stats", action="store_true",
+                        help="Do not record this run's throughput for --estimate "
+                             "(LITESWITCH_STATS_PATH picks another file to record it in)")
+    parser.add_argument("--collect", action="store_true",
+                        help="Merge concurrent invocations (one per selected file, as Explorer starts them) into one batch")
+
+    parser.add_argument("--trace", metavar="OUT.json",
+                        help="Record timed spans of every stage and subprocess as a Chrome/Perfetto trace")
+    parser.add_argument("--profile", nargs="?", const="liteswitch_profile", metavar="DIR",
+                        help="Run every job under cProfile and write one .pstats file per job to DIR "
+                             "(default: ./liteswitch_profile)")
+    parser.add_argument("--optimize-pdf", choices=list(PDF_OPTIMIZE_PRESETS),
+                        help="Shrink PDF output: 'lossless' recompresses the structure only, "
+                             "'screen' and 'print' also downsample images")
+
+    raster = parser.add_argument_group("image output", "Rendering of PDF pages and slides to images")
+    raster.add_argument("--raster-preset", choices=sorted(RASTER_PRESETS), default="default",
+                        help="'fast' trades a little fidelity for much faster, smaller output")
+    raster.add_argument("--dpi", type=parse_positive, help="Render resolution")
+    raster.add_argument("--max-pixels", type=parse_count, help="Upper bound on width x height per page")
+    raster.add_argument("--image-format", choices=RASTER_FORMATS, help="Image format (default: png)")
+    raster.add_argument("--quality", type=parse_quality, metavar="1-100", help="JPEG/WebP quality")
+    raster.add_argument("--compression", type=int, choices=range(10), metavar="0-9",
+                        help="PNG compression level (lower is faster)")
+    raster.add_argument("--grayscale", action="store_true", help="Render in grayscale")
+    raster.add_argument("--alpha", action="store_true", help="Keep transparency (PNG/WebP)")
+    raster.add_argument("--archive", choices=ARCHIVE_FORMATS,
+                        help="Write the page images into one archive instead of one file per page")
+    raster.add_argument("--no-dedup", dest="dedup", action="store_false",
+                        help="Render repeated pages again instead of reusing the first copy")
+    raster.add_argument("--blank-pages", choices=BLANK_PAGE_MODES, default="keep",
+                        help="Blank pages and slides: 'skip' leaves them out, 'collapse' keeps one "
+                             "per run of consecutive blanks")
+
+    sandbox = parser.add_argument_group("sandbox", "Run PDF/text conversions in limited worker processes, "
+                                        "so one bad file cannot take the batch down")
+    sandbox.add_argument("--sandbox", action="store_true", help="Enable with the default limits below")
+    sandbox.add_argument("--job-memory", type=parse_budget, metavar="SIZE",
+                         help="Address space of each worker (default: 4G; 0: no limit; implies --sandbox)")
+    sandbox.add_argument("--job-cpu", type=int, metavar="SECONDS",
+                         help="CPU time of each file (default: 600; implies --sandbox)")
+    sandbox.add_argument("--job-timeout", type=float, metavar="SECONDS",
+                         help="Wall-clock time of each file (default: 900; implies --sandbox)")
+
+    thumbs = parser.add_argument_group("thumbnails", "Options for --to thumbnail")
+    thumbs.add_argument("--thumbnail-size", type=parse_size, default=(256, 256), metavar="WxH",
+                        help="Bounding box of each thumbnail (default: 256x256)")
+    thumbs.add_argument("--thumbnail-pages", type=parse_count, default=1, help="Pages/slides per document (default: 1)")
+    thumbs.add_argument("--thumbnail-dir", help="Write all thumbnails into this folder")
+    thumbs.add_argument("--sprite", metavar="PNG", help="Also pack the thumbnails into one sprite sheet (+ .json index)")
     
     args = parser.parse_args()
+    QUIET = args.quiet
     
     # Robust Argument Parsing
     # Sometimes (e.g. Linux Desktop Entry with "%F"), args might be passed as a single merged string
@@ -79,9 +237,19 @@ def main():
     input_paths = [os.path.abspath(f.strip('"').strip("'")) for f in raw_files]
     
     if args.to:
-        target_ext = args.to.lower().lstrip('.')
+        target_ext = ",".join(parse_targets(args.to))
     else:
         target_ext = None
+
+    if args.collect and target_ext:
+        selection = collect_batch(input_paths, target_ext)
+        if selection is None:
+            logging.info(f"Handed {len(input_paths)} file(s) to the running batch")
+            sys.exit(0)
+        if not selection:
+            logging.info("Nothing left to convert: the previous batch took every file")
+            sys.exit(0)
+        input_paths = selection
     
     # Validation: Check existence
     valid_files = []
@@ -144,24 +312,74 @@ def main():
     # Now execute conversion loop
     success_count = 0
     errors = []
+    batch = []
+    targets = parse_targets(target_ext)
     
     for input_path in valid_files:
         current_ext = os.path.splitext(input_path)[1].lower().lstrip('.')
         
-        # Check if this specific file supports the detected target
+        # Check which of the targets this specific file supports
         # (Handling mixed batches gracefully)
-        if current_ext not in CONVERSION_MAP or target_ext not in CONVERSION_MAP[current_ext]:
-            logging.warning(f"Skipping {os.path.basename(input_path)}: cannot convert .{current_ext} to .{target_ext}")
-            continue
+        supported = [t for t in targets if t in CONVERSION_MAP.get(current_ext, {})]
+        for t in targets:
+            if t not in supported:
+                logging.warning(f"Skipping {os.path.basename(input_path)}: cannot convert .{current_ext} to .{t}")
+        if supported:
+            batch.append((input_path, ",".join(supported)))
 
-        try:
-            converter = CONVERSION_MAP[current_ext][target_ext]
-            output_path = converter(input_path)
-            logging.info(f"Success: {output_path}")
-            success_count += 1
-        except Exception as e:
-            logging.exception(f"Failed to convert {input_path}")
+    # Office conversions run on separate LibreOffice profiles and in-process ones
+    # on a process pool, so the batch is spread across all cores.
+    jobs = max(1, args.jobs)
+    set_office_workers(jobs)
+    if args.thumbnail_dir:
+        os.makedirs(args.thumbnail_dir, exist_ok=True)
+    memory_budget = args.memory_budget if args.memory_budget is not None else default_memory_budget()
+    # Learned from past runs; --estimate predicts from it, real runs add to it
+    stats = ThroughputStats()
+    if args.estimate:
+        print(format_plan(estimate_jobs(batch, stats, raster_options_from_args(args)), jobs, memory_budget,
+                          os.cpu_count()))
+        sys.exit(0)
+    # Both are switched on through the environment, which the worker processes inherit
+    if args.trace:
+        tracing.start_trace()
+    if args.profile:
+        tracing.start_profiling(args.profile)
+    executor = sandbox_executor_from_args(args, jobs)
+    if args.no_stats:
+        stats = None
+    results = asyncio.run(convert_jobs_async(batch, limit=jobs, executor=executor, memory_budget=memory_budget,
+                                             stats=stats,
+                                             raster=raster_options_from_args(args),
+                                             archive=args.archive,
+                                             dedup=args.dedup,
+                                             blank_pages=args.blank_pages,
+                                             pdf_optimize=args.optimize_pdf,
+                                             thumbnail_box=args.thumbnail_size,
+                                             thumbnail_pages=args.thumbnail_pages,
+                                             thumbnail_dir=args.thumbnail_dir))
+    shutdown_executor()
+    if executor:
+        executor.shutdown()
+    try:
+        if stats is not None:
+            stats.save()
+    except OSError as e:
+        logging.warning(f"Cannot save throughput stats: {e}")
+    if args.trace:
+        tracing.finish_trace(os.path.abspath(args.trace))
+
+    for (input_path, _), result in zip(batch, results):
+        if isinstance(result, BaseException):
+            logging.error(f"Failed to convert {input_path}", exc_info=result)
             errors.append(os.path.basename(input_path))
+        else:
+            logging.info(f"Success: {result}")
+            success_count += 1
+
+    if args.sprite and target_ext == "thumbnail" and success_count:
+        thumbnails = {p: r for (p, _), r in zip(batch, results) if not isinstance(r, BaseException)}
+        build_sprite_sheet(thumbnails, os.path.abspath(args.sprite), args.thumbnail_size)
 
     # Final Summary
     if success_count > 0:
@@ -182,6 +400,8 @@ def main():
         show_message("LiteSwitch Success", f"{catchphrase}\n\n{msg}")
     elif errors:
         show_message("LiteSwitch Error", f"Conversion failed for all files.\nCheck logs for details.", is_error=True)
+    if QUIET and errors:
+        sys.exit(1)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,224 @@
+"""
+Memory-aware admission of batch jobs.
+
+Running many high-resolution rasterizations at once can exhaust RAM, while
+running them one by one leaves cores idle. Each job's peak memory is
+estimated up front from cheap metadata (page count, page size, render scale)
+and jobs only start while the sum of the estimates of running jobs fits a
+budget.
+"""
+
+import os
+import re
+import sys
+import asyncio
+import logging
+import functools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+
+from converter.raster import (RasterOptions, PDF_PNG_OPTIONS, PDF_PPTX_OPTIONS, SLIDE_PNG_OPTIONS,
+                              SLIDE_PNG_SIZE)
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+JOB_BASE_BYTES = 64 * MIB      # Interpreter, fitz and document structures of one job
+OFFICE_JOB_BYTES = 400 * MIB   # One headless LibreOffice/Office instance
+PIXMAP_COPIES = 3              # Pixmap + samples copy + encode buffer alive at once
+PAGE_SAMPLE = 32               # Pages looked at to find the largest page size
+# Working set per input byte of the text/layout converters (pdfminer, pdf2docx, pandoc)
+TEXT_BYTES_PER_INPUT_BYTE = {"docx": 40, "default": 10}
+# Targets that start an office suite (a PPTX thumbnail may fall back to one)
+OFFICE_TARGETS = {
+    "docx": ("pdf",),
+    "pptx": ("pdf", "png", "txt", "docx", "thumbnail"),
+    "ppt": ("pdf", "png", "txt", "docx", "thumbnail"),
+}
+BUDGET_SHARE = 0.75            # Default budget: this share of the memory available at start
+MAX_BYPASS = 8                 # Smaller jobs that may start ahead of a waiting one
+
+
+def parse_memory(value: str) -> int:
+    """'512M', '4G', '4096' (MiB) -> bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid memory size: {value}")
+    number, unit = float(match.group(1)), match.group(2).upper() or "M"
+    return int(number * 1024 ** "KMGT".index(unit) * 1024)
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of RAM available for new work, or None if it cannot be told."""
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def default_memory_budget() -> int:
+    """$LITESWITCH_MEMORY_BUDGET (e.g. '6G'), else BUDGET_SHARE of the available RAM."""
+    override = os.environ.get("LITESWITCH_MEMORY_BUDGET")
+    if override:
+        return parse_memory(override)
+    available = available_memory()
+    return int(available * BUDGET_SHARE) if available else 4096 * MIB
+
+
+def pdf_geometry(pdf_path: str) -> Tuple[int, float, float]:
+    """(page count, width, height in points of the largest of the first PAGE_SAMPLE pages)."""
+    stat = os.stat(pdf_path)
+    # Admission and throughput records both ask, so each file is opened once per batch
+    return _pdf_geometry(os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=1024)
+def _pdf_geometry(pdf_path: str, size: int, mtime_ns: int) -> Tuple[int, float, float]:
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        width = height = 0.0
+        for n in range(min(doc.page_count, PAGE_SAMPLE)):
+            rect = doc.load_page(n).rect
+            if rect.width * rect.height > width * height:
+                width, height = rect.width, rect.height
+        return doc.page_count, width, height
+
+
+def pixmap_bytes(options: RasterOptions, width: float, height: float) -> int:
+    """Size of one rendered page's samples."""
+    zoom = options.zoom(width, height)
+    channels = (1 if options.grayscale else 3) + (1 if options.alpha else 0)
+    return int(width * zoom) * int(height * zoom) * channels
+
+
+def _pdf_raster_estimate(input_path: str, target: str, raster: Optional[RasterOptions]) -> int:
+    options = (raster or RasterOptions()).resolve(PDF_PNG_OPTIONS if target == "png" else PDF_PPTX_OPTIONS)
+    pages, width, height = pdf_geometry(input_path)
+    page_bytes = pixmap_bytes(options, width, height)
+    estimate = page_bytes * PIXMAP_COPIES
+    if target == "pptx":
+        # python-pptx keeps every encoded slide image until the deck is saved
+        estimate += pages * page_bytes // (10 if options.fmt == "jpeg" else 3)
+    return estimate
+
+
+def estimate_job_memory(input_path: str, target_ext: str, raster: Optional[RasterOptions] = None) -> int:
+    """
+    Rough peak memory in bytes of converting input_path to target_ext (several
+    comma-separated targets are summed, as they may run side by side).
+    Includes the helper processes a job starts (office suite, render workers).
+    """
+    source_ext = os.path.splitext(input_path)[1].lower().lstrip('.')
+    size = os.path.getsize(input_path)
+    total = 0
+    for target in [t.strip().lower().lstrip('.') for t in target_ext.split(",") if t.strip()]:
+        estimate = JOB_BASE_BYTES
+        if source_ext == "pdf" and target in ("png", "pptx"):
+            estimate += _pdf_raster_estimate(input_path, target, raster)
+        elif target in OFFICE_TARGETS.get(source_ext, ()):
+            estimate += OFFICE_JOB_BYTES + 10 * size
+            if target == "png":
+                # Slides are rasterized on one process per core
+                options = (raster or RasterOptions()).resolve(SLIDE_PNG_OPTIONS)
+                estimate += (os.cpu_count() or 1) * PIXMAP_COPIES * pixmap_bytes(options, *SLIDE_PNG_SIZE)
+        elif target != "thumbnail":
+            estimate += size * TEXT_BYTES_PER_INPUT_BYTE.get(target, TEXT_BYTES_PER_INPUT_BYTE["default"])
+        total += estimate
+    return total
+
+
+class _Waiter:
+    __slots__ = ("estimate", "future", "bypassed")
+
+    def __init__(self, estimate: int, future: asyncio.Future):
+        self.estimate = estimate
+        self.future = future
+        self.bypassed = 0
+
+
+class MemoryAdmission:
+    """
+    Admits jobs while the sum of their estimates fits `budget` bytes.
+    Waiting jobs are served in arrival order, but smaller ones may start ahead
+    of a job that does not fit yet, so one huge PDF does not hold up a queue of
+    small files. After MAX_BYPASS such overtakes nothing else starts until the
+    waiting job fits, so it is not starved either. A job bigger than the whole
+    budget runs on its own.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.in_use = 0
+        self.running = 0
+        self._waiting: List[_Waiter] = []
+
+    def _fits(self, estimate: int) -> bool:
+        return self.running == 0 or self.in_use + estimate <= self.budget
+
+    def _admit(self, waiter: _Waiter) -> None:
+        self._waiting.remove(waiter)
+        self.in_use += waiter.estimate
+        self.running += 1
+        waiter.future.set_result(None)
+
+    def _dispatch(self) -> None:
+        blocked = None  # Earliest waiter that did not fit
+        for waiter in list(self._waiting):
+            if waiter.future.cancelled():
+                self._waiting.remove(waiter)
+                continue
+            if blocked is not None and blocked.bypassed >= MAX_BYPASS:
+                break
+            if self._fits(waiter.estimate):
+                self._admit(waiter)
+                if blocked is not None:
+                    blocked.bypassed += 1
+            elif blocked is None:
+                blocked = waiter
+
+    def _release(self, estimate: int) -> None:
+        self.in_use -= estimate
+        self.running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def reserve(self, estimate: int) -> AsyncIterator[None]:
+        """Waits until the job may start and holds its share of the budget for the block."""
+        waiter = _Waiter(estimate, asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        self._dispatch()
+        if not waiter.future.done():
+            logger.info(f"Waiting for memory: {estimate // MIB} MiB needed, "
+                        f"{(self.budget - self.in_use) // MIB} MiB free")
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+                self._dispatch()
+            elif not waiter.future.cancelled():
+                self._release(estimate)
+            raise
+        try:
+            yield
+        finally:
+            self._release(estimate)
@@ -0,0 +1,97 @@
+"""
+Single-file archives for conversions that produce one image per page.
+
+Thousands of loose files are slow to create on network shares and slow to
+list. Instead, pages are appended to one ZIP or TAR as they are encoded.
+Members are stored, not compressed: PNG/JPEG/WebP data is already compressed,
+and deflating it again costs CPU for almost no saving.
+"""
+
+import io
+import os
+import re
+import time
+import tarfile
+import zipfile
+from typing import Optional
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+
+class PageArchive:
+    """Appends in-memory files to a ZIP or TAR archive; use as a context manager."""
+
+    def __init__(self, path: str, kind: str):
+        if kind not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {kind}")
+        self.path = path
+        self.kind = kind
+        self.count = 0
+        if kind == "zip":
+            self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(
+                path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+            self._tar: Optional[tarfile.TarFile] = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, "w")
+
+    def add(self, name: str, data: bytes) -> str:
+        """Writes one member and returns its name. Nothing is kept in memory after the call returns."""
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+        self.count += 1
+        return name
+
+    def add_link(self, name: str, target: str) -> None:
+        """
+        Adds `name` with the content of the earlier member `target`. TAR stores a
+        hard link; ZIP has no links, so the stored bytes are copied.
+        """
+        if self._zip is not None:
+            self.add(name, self._zip.read(target))
+            return
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.LNKTYPE
+        info.linkname = target
+        info.mtime = int(time.time())
+        self._tar.addfile(info)
+        self.count += 1
+
+    def add_file(self, name: str, path: str) -> None:
+        with open(path, "rb") as f:
+            self.add(name, f.read())
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+
+    def __enter__(self) -> "PageArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def archive_path(output_dir_or_base: str, kind: str) -> str:
+    """name_LiteSwitch_Slides -> name_LiteSwitch_Slides.zip"""
+    return f"{output_dir_or_base}.{kind}"
+
+
+def pack_directory(src_dir: str, dest_path: str, kind: str) -> str:
+    """Archives the files of src_dir into dest_path, Slide_2 before Slide_10."""
+    def natural(name: str):
+        return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+    with PageArchive(dest_path, kind) as pages:
+        for name in sorted(os.listdir(src_dir), key=natural):
+            pages.add_file(name, os.path.join(src_dir, name))
+    return dest_path
@@ -0,0 +1,227 @@
+"""
+asyncio front-end for the converters.
+
+Conversions backed by an external program (LibreOffice, PowerShell, pandoc)
+run through asyncio.create_subprocess_exec, so waiting on them costs no
+thread. In-process conversions (fitz, pdfminer, pdf2docx, ...) are CPU-bound
+and hold the GIL, so they are pushed onto a process pool.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from converter.document_converter import (CONVERSION_MAP, EXTERNAL_JOB_MAP, accepted_options,
+                                         parse_targets, split_targets, pdf_to_many)
+from converter.external import run_external_job_async, fitz_thread
+from converter.admission import MemoryAdmission, estimate_job_memory, JOB_BASE_BYTES, MIB
+from converter.estimate import ThroughputStats, InputInfo, describe_input, output_bytes
+from converter import tracing
+
+logger = logging.getLogger(__name__)
+
+# Trace track ids of batch jobs (kept clear of real thread ids and PIDs)
+JOB_TRACK_BASE = 1 << 30
+
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_cpu_executor() -> ProcessPoolExecutor:
+    """Lazily creates the shared process pool for in-process converters."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _cpu_executor
+
+
+def shutdown_executor() -> None:
+    """Stops the shared process pool (it is recreated on next use)."""
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown()
+        _cpu_executor = None
+
+
+def _run_in_process(converter: Callable, input_path: str, target_ext: str, *args, **kwargs):
+    """Runs an in-process converter in a pool worker, traced and profiled if enabled."""
+    with tracing.profiled(input_path, target_ext), \
+            tracing.span(converter.__name__, cat="job", input=os.path.basename(input_path)):
+        return converter(input_path, *args, **kwargs)
+
+
+def _profiled_finalize(input_path: str, target_ext: str, finalize: Callable[[], str]) -> str:
+    # The Python side of an external job (e.g. rasterizing the tool's PDF)
+    with tracing.profiled(input_path, target_ext):
+        return finalize()
+
+
+async def convert_async(input_path: str, target_ext: str, executor: Optional[Executor] = None,
+                        **options) -> Union[Optional[str], Dict[str, Optional[str]]]:
+    """
+    Converts input_path to target_ext without blocking the event loop.
+    `executor` overrides the process pool used for in-process converters.
+    `options` and comma-separated targets work as in document_converter.convert().
+    """
+    source_ext = os.path.splitext(input_path)[1].lower().lstrip('.')
+    targets = parse_targets(target_ext)
+
+    for target in targets:
+        if source_ext not in CONVERSION_MAP or target not in CONVERSION_MAP[source_ext]:
+            raise ValueError(f"Cannot convert .{source_ext} to .{target}")
+
+    if len(targets) > 1:
+        return await _convert_targets_async(input_path, source_ext, targets, executor, options)
+    target_ext = targets[0]
+
+    builder = EXTERNAL_JOB_MAP.get(source_ext, {}).get(target_ext)
+    job = builder(input_path, **accepted_options(builder, options)) if builder else None
+    if job is not None:
+        logger.info(f"Async {job.label}: {input_path} -> {target_ext}")
+        job = job._replace(finalize=functools.partial(_profiled_finalize, input_path, target_ext, job.finalize))
+        return await run_external_job_async(job)
+
+    converter = CONVERSION_MAP[source_ext][target_ext]
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_run_in_process, converter, input_path, target_ext,
+                             **accepted_options(converter, options))
+    return await loop.run_in_executor(executor or _get_cpu_executor(), call)
+
+
+async def _convert_targets_async(input_path: str, source_ext: str, targets: List[str],
+                                 executor: Optional[Executor], options: dict) -> Dict[str, Optional[str]]:
+    """Several targets of one file: page-based PDF targets share one pass, the rest run alongside."""
+    shared, separate = split_targets(source_ext, targets)
+    pending = [convert_async(input_path, t, executor=executor, **options) for t in separate]
+    if shared:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(_run_in_process, pdf_to_many, input_path, ",".join(shared), shared,
+                                 **accepted_options(pdf_to_many, options))
+        pending.append(loop.run_in_executor(executor or _get_cpu_executor(), call))
+
+    results = await asyncio.gather(*pending)
+    outputs = dict(zip(separate, results))
+    if shared:
+        outputs.update(results[-1])
+    return outputs
+
+
+def _estimate(path: str, target_ext: str, options: dict) -> int:
+    try:
+        return estimate_job_memory(path, target_ext, options.get("raster"))
+    except Exception as e:
+        # The conversion itself will report the problem
+        logger.warning(f"Cannot estimate memory for {path}: {e}")
+        return JOB_BASE_BYTES
+
+
+def _describe(path: str) -> Optional[InputInfo]:
+    try:
+        # Page counts come from admission's cached pdf_geometry(); image counts are not needed
+        return describe_input(path, count_images=False)
+    except Exception as e:
+        logger.warning(f"Cannot record the throughput of {path}: {e}")
+        return None
+
+
+class _ShareClock:
+    """
+    Time as a job running on a core of its own would see it: while more jobs
+    run than there are cores, each advances at cores / running. Recorded
+    throughput is kept free of contention this way; estimate.plan_batch()
+    applies the same slowdown from the job limit and the core count.
+    """
+
+    def __init__(self, cores: int):
+        self.cores = cores
+        self.running = 0
+        self._value = 0.0
+        self._last = time.perf_counter()
+
+    def _advance(self) -> float:
+        now = time.perf_counter()
+        if self.running:
+            self._value += (now - self._last) * min(1.0, self.cores / self.running)
+        self._last = now
+        return self._value
+
+    def start(self) -> float:
+        started = self._advance()
+        self.running += 1
+        return started
+
+    def stop(self, started: float) -> float:
+        """Seconds of a job that started at `started` (a start() value)."""
+        elapsed = self._advance() - started
+        self.running -= 1
+        return elapsed
+
+
+async def convert_jobs_async(jobs: List[Tuple[str, str]], limit: int = 64,
+                             executor: Optional[Executor] = None, memory_budget: Optional[int] = None,
+                             stats: Optional[ThroughputStats] = None,
+                             **options) -> List[Union[str, Dict[str, str], None, BaseException]]:
+    """
+    Runs (input path, target) pairs concurrently, keeping at most `limit` in flight.
+    With `memory_budget` (bytes), a job also waits until its estimated peak
+    memory fits next to the running ones (see admission.MemoryAdmission).
+    With `stats`, each successful job's time and output size are added to it
+    (the caller saves it), which is what cli.py --estimate predicts from.
+    Times are taken on a _ShareClock, so they do not depend on the concurrency.
+    Results come back in job order; a failed job yields its exception instead of a path.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    admission = MemoryAdmission(memory_budget) if memory_budget else None
+    # Estimates and throughput records open the inputs with fitz, which must stay on one thread
+    estimator = fitz_thread()
+    loop = asyncio.get_running_loop()
+    clock = _ShareClock(os.cpu_count() or 1)
+
+    async def convert(path: str, target_ext: str):
+        """(result, seconds on the share clock)."""
+        started = clock.start()
+        try:
+            result = await convert_async(path, target_ext, executor=executor, **options)
+        finally:
+            seconds = clock.stop(started)
+        return result, seconds
+
+    async def run_one(index: int, path: str, target_ext: str):
+        # One trace track per job: time spent queued, then converting
+        track = JOB_TRACK_BASE + index
+        tracing.name_track(track, f"{os.path.basename(path)} -> {target_ext}")
+        queued = tracing.now_us()
+        # Inputs are read before the job takes a slot, so the slot is held only while converting
+        info = await loop.run_in_executor(estimator, _describe, path) if stats is not None else None
+        if admission is None:
+            async with semaphore:
+                tracing.record("queued", "job", queued, tracing.now_us(), tid=track)
+                with tracing.span("convert", cat="job", tid=track):
+                    result, seconds = await convert(path, target_ext)
+        else:
+            estimate = await loop.run_in_executor(estimator, _estimate, path, target_ext, options)
+            # Slot first: a job parked on the semaphore must not hold budget the running ones could use
+            async with semaphore:
+                async with admission.reserve(estimate):
+                    tracing.record("queued", "job", queued, tracing.now_us(), tid=track,
+                                   estimate_mib=estimate // MIB)
+                    logger.info(f"Starting {path} (~{estimate // MIB} MiB)")
+                    with tracing.span("convert", cat="job", tid=track):
+                        result, seconds = await convert(path, target_ext)
+        if info is not None:
+            out = await loop.run_in_executor(None, output_bytes, result, info.units)
+            stats.add_run(info, target_ext, seconds, out)
+        return result
+
+    return await asyncio.gather(*(run_one(i, p, t) for i, (p, t) in enumerate(jobs)),
+                                return_exceptions=True)
+
+
+async def convert_many_async(input_paths: List[str], target_ext: str, limit: int = 64,
+                             executor: Optional[Executor] = None,
+                             **options) -> List[Union[str, Dict[str, str], None, BaseException]]:
+    """Converts a batch to one target (see convert_jobs_async)."""
+    return await convert_jobs_async([(p, target_ext) for p in input_paths], limit, executor, **options)
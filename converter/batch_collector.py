@@ -0,0 +1,115 @@
+"""
+Gathers a multi-selection that the shell delivers as one process per file.
+
+Explorer runs a context-menu verb once per selected file. With `--collect`,
+the first of those processes becomes the leader: it keeps collecting paths
+until none have arrived for COLLECT_QUIET seconds, then converts the whole
+selection in one run. Every other process drops its path into a spool
+folder and exits straight away.
+"""
+
+import os
+import re
+import time
+import uuid
+import tempfile
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SPOOL_ROOT = os.path.join(tempfile.gettempdir(), "liteswitch_batches")
+COLLECT_QUIET = 0.75     # Seconds without new files that end the selection
+COLLECT_MAX_WAIT = 30.0  # Upper bound on the collection phase
+COLLECT_POLL = 0.05
+LOCK_STALE = 60.0        # A leader lock older than this belongs to a crashed run
+
+
+def _batch_dir(key: str) -> str:
+    return os.path.join(SPOOL_ROOT, re.sub(r"[^\w.-]", "_", key))
+
+
+def _try_lead(lock_path: str) -> bool:
+    """Atomically creates the leader lock; clears it first if it is stale."""
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock_path) > LOCK_STALE:
+                logger.warning(f"Removing stale batch lock: {lock_path}")
+                os.remove(lock_path)
+                return _try_lead(lock_path)
+        except OSError:
+            pass
+        return False
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return True
+
+
+def _spool(batch_dir: str, paths: List[str]) -> None:
+    name = uuid.uuid4().hex
+    tmp_path = os.path.join(batch_dir, f"{name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paths))
+    os.replace(tmp_path, os.path.join(batch_dir, f"{name}.paths"))
+
+
+def _drain(batch_dir: str) -> List[str]:
+    """Claims and reads every spooled entry. Renaming first means two leaders never both take one."""
+    collected = []
+    for entry in sorted(os.listdir(batch_dir)):
+        if not entry.endswith(".paths"):
+            continue
+        claimed = os.path.join(batch_dir, f"{entry}.{os.getpid()}.claimed")
+        try:
+            os.rename(os.path.join(batch_dir, entry), claimed)
+        except OSError:
+            continue  # Taken by another leader
+        with open(claimed, "r", encoding="utf-8") as f:
+            collected.extend(line for line in f.read().splitlines() if line)
+        os.remove(claimed)
+    return collected
+
+
+def collect_batch(paths: List[str], key: str) -> Optional[List[str]]:
+    """
+    Returns the full selection if this process should run it, or None if the
+    paths were handed to another process. `key` separates unrelated batches
+    (e.g. the target format).
+    """
+    batch_dir = _batch_dir(key)
+    os.makedirs(batch_dir, exist_ok=True)
+    lock_path = os.path.join(batch_dir, "leader.lock")
+
+    collected = list(paths)
+    if not _try_lead(lock_path):
+        _spool(batch_dir, paths)
+        # If the leader released the lock before our entry landed, nobody would pick it up
+        if os.path.exists(lock_path) or not _try_lead(lock_path):
+            return None
+        # Under the lock now: the old leader's last drain may have taken our entry after all
+        collected = _drain(batch_dir)
+        if not collected:
+            os.remove(lock_path)
+            return None
+
+    try:
+        start = last_arrival = time.monotonic()
+        while True:
+            time.sleep(COLLECT_POLL)
+            now = time.monotonic()
+            arrived = _drain(batch_dir)
+            if arrived:
+                collected.extend(arrived)
+                last_arrival = now
+            elif now - last_arrival >= COLLECT_QUIET or now - start >= COLLECT_MAX_WAIT:
+                break
+    finally:
+        os.remove(lock_path)
+
+    # Entries that landed between the last poll and releasing the lock
+    collected.extend(_drain(batch_dir))
+    selection = list(dict.fromkeys(collected))
+    logger.info(f"Collected a selection of {len(selection)} file(s) for '{key}'")
+    return selection
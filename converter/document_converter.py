@@ -3,30 +3,109 @@
 import os
 import io
 import sys
+import uuid
+import asyncio
+import hashlib
+import inspect
+import dataclasses
 import logging
-import subprocess
 import shutil
+import tempfile
+import pathlib
 import platform
-from typing import Optional, Callable, Dict
+from contextlib import contextmanager, asynccontextmanager, ExitStack
+from typing import Optional, Callable, Dict, Iterator, AsyncIterator, List, Set, Tuple
+
+from converter.external import (ExternalJob, run_external_job, run_external_job_async, reap_orphans,
+                                com_server_pids, on_fitz_thread)
+from converter import pandoc_cache, tracing
+from converter.office_pool import OfficeProfilePool, default_profile_root
+from converter.scratch import make_scratch_dir, scratch_dir, staged_output, partial_output, publish, publish_link
+from converter.archive import PageArchive, archive_path, pack_directory
+from converter.pdf_optimize import optimize_pdf
+from converter.html_export import export_pdf_html, HTML_IMAGE_MODES
+from converter.raster import (RasterOptions, PageCache, BlankPageFilter, render_pdf_pages, iter_encoded_pages,
+                              select_pages, SLIDE_PNG_SIZE,
+                              BASE_OPTIONS, PDF_PNG_OPTIONS, PDF_PPTX_OPTIONS, SLIDE_PNG_OPTIONS)
 
 # Detect Linux Office Binary (LibreOffice or OpenOffice)
 LINUX_OFFICE_BIN = None
 if platform.system() == "Linux":
-    # Prioritize libreoffice, then soffice (generic)
-    LINUX_OFFICE_BIN = shutil.which("libreoffice") or shutil.which("soffice")
+    # $LITESWITCH_OFFICE_BIN first (e.g. the load test's stub), then libreoffice, then soffice (generic)
+    LINUX_OFFICE_BIN = (os.environ.get("LITESWITCH_OFFICE_BIN")
+                        or shutil.which("libreoffice") or shutil.which("soffice"))
 
 # Configure Logger (inherits from main app if setup, else default)
 logger = logging.getLogger(__name__)
 
-def linux_office_convert(input_path: str, output_format: str) -> Optional[str]:
-    """Helper to convert using LibreOffice/OpenOffice on Linux."""
+# Wall-clock limit (seconds) per external backend. An overrunning tool is killed
+# together with its whole process group so one corrupt file cannot hang a batch.
+EXTERNAL_TIMEOUTS: Dict[str, float] = {
+    "office": 300,
+    "powershell": 300,
+    "pandoc": 120,
+}
+
+# Command-line flags of Word/PowerPoint instances started as COM automation servers
+COM_SERVER_MARKERS = ["/Automation", "-Embedding"]
+
+# Number of LibreOffice instances allowed to run at once. Each gets its own
+# persistent profile, since instances sharing a profile collide on its lock.
+# $LITESWITCH_OFFICE_WORKERS is an upper bound that set_office_workers() keeps.
+def _office_workers_limit() -> Optional[int]:
+    """$LITESWITCH_OFFICE_WORKERS as a positive number, or None (unset, or not a positive whole number)."""
+    value = os.environ.get("LITESWITCH_OFFICE_WORKERS", "").strip()
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        logger.warning(f"Ignoring LITESWITCH_OFFICE_WORKERS={value!r}: expected a whole number above 0")
+        return None
+    return limit
+
+OFFICE_WORKERS_LIMIT = _office_workers_limit()
+OFFICE_WORKERS = OFFICE_WORKERS_LIMIT or os.cpu_count() or 1
+OFFICE_POOL = OfficeProfilePool(default_profile_root(), OFFICE_WORKERS)
+
+# Word and PowerPoint run as one shared instance per user, so one script's Quit()
+# would end its siblings' conversions: COM jobs take this single slot, across
+# threads and separate cli.py runs alike.
+COM_SLOT = OfficeProfilePool(os.path.join(os.path.dirname(default_profile_root()), "com_lock"), 1)
+
+def set_office_workers(count: int) -> None:
+    """Changes how many LibreOffice instances may run concurrently (at most $LITESWITCH_OFFICE_WORKERS)."""
+    if OFFICE_WORKERS_LIMIT:
+        count = min(count, OFFICE_WORKERS_LIMIT)
+    OFFICE_POOL.size = max(1, count)
+
+def with_office_profile(cmd: List[str], profile_dir: str) -> List[str]:
+    """Points a LibreOffice command at its own user profile instead of the shared default one."""
+    profile_url = pathlib.Path(profile_dir).resolve().as_uri()
+    return [cmd[0], f"-env:UserInstallation={profile_url}"] + cmd[1:]
+
+def reap_office_orphans() -> None:
+    """Kills headless converters left behind by killed runs (they hold the profile lock)."""
+    reap_orphans("soffice", ["--headless", "--convert-to"])
+
+
+def linux_office_job(input_path: str, output_format: str,
+                     finalize_with: Optional[Callable[[str], str]] = None,
+                     pdf_optimize: Optional[str] = None) -> ExternalJob:
+    """
+    Builds the LibreOffice/OpenOffice command for a Linux conversion.
+    LibreOffice writes into a scratch directory; by default the result is then
+    published as name_LiteSwitch.fmt. `finalize_with` instead receives the
+    scratch path of the converted file (e.g. to rasterize an intermediate PDF).
+    A published PDF is first optimized with the `pdf_optimize` preset, if given.
+    """
     if not LINUX_OFFICE_BIN:
          raise Exception("No Office suite found (tried 'libreoffice', 'soffice'). Please install LibreOffice.")
     
-    logger.info(f"Linux Conversion: {input_path} -> {output_format} using {LINUX_OFFICE_BIN}")
-    
-    # Command: libreoffice --headless --convert-to pdf --outdir /path/to/dir input_file
-    out_dir = os.path.dirname(input_path)
+    # Command: libreoffice --headless --convert-to pdf --outdir /path/to/scratch input_file
+    out_dir = make_scratch_dir(os.path.getsize(input_path))
     cmd = [
         LINUX_OFFICE_BIN,
         "--headless",
@@ -34,151 +113,300 @@ def linux_office_convert(input_path: str, output_format: str) -> Optional[str]:
         "--outdir", out_dir,
         input_path
     ]
-    
-    # Run
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        logger.error(f"Office conversion failed: {result.stderr}")
-        raise Exception(f"Conversion failed: {result.stderr}")
-        
-    # Predict output name
+
+    def finalize() -> str:
+        # Predict output name (LibreOffice keeps the input's base name)
+        base, _ = os.path.splitext(input_path)
+        output_path = os.path.join(out_dir, f"{os.path.basename(base)}.{output_format}")
+        if not os.path.exists(output_path):
+            raise Exception("Output file not found after conversion.")
+
+        if finalize_with:
+            return finalize_with(output_path)
+        if output_format == "pdf" and pdf_optimize:
+            optimize_pdf(output_path, pdf_optimize)
+        # LiteSwitch convention: name_LiteSwitch.fmt
+        return publish(output_path, f"{base}_LiteSwitch.{output_format}")
+
+    @contextmanager
+    def prepare() -> Iterator[List[str]]:
+        with OFFICE_POOL.slot() as profile_dir:
+            yield with_office_profile(cmd, profile_dir)
+
+    @asynccontextmanager
+    async def prepare_async() -> AsyncIterator[List[str]]:
+        async with OFFICE_POOL.slot_async() as profile_dir:
+            yield with_office_profile(cmd, profile_dir)
+
+    @contextmanager
+    def retry() -> Iterator[List[str]]:
+        # A hung instance may have left the profile in a bad state; retry on a throwaway one
+        reap_office_orphans()
+        profile_dir = tempfile.mkdtemp(prefix="liteswitch_profile_")
+        try:
+            yield with_office_profile(cmd, profile_dir)
+        finally:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    return ExternalJob("Office conversion", cmd, finalize,
+                       timeout=EXTERNAL_TIMEOUTS["office"],
+                       on_kill=reap_office_orphans, retry=retry,
+                       prepare=prepare, prepare_async=prepare_async,
+                       cleanup=lambda: shutil.rmtree(out_dir, ignore_errors=True))
+
+
+def linux_office_convert(input_path: str, output_format: str,
+                         pdf_optimize: Optional[str] = None) -> Optional[str]:
+    """Helper to convert using LibreOffice/OpenOffice on Linux."""
+    job = linux_office_job(input_path, output_format, pdf_optimize=pdf_optimize)
+    logger.info(f"Linux Conversion: {input_path} -> {output_format} using {LINUX_OFFICE_BIN}")
+    return run_external_job(job)
+
+
+def powershell_job(label: str, ps_script: str, work_dir: str, scratch_output: str,
+                   output_path: str, com_server: str,
+                   finalize_with: Optional[Callable[[str], str]] = None) -> ExternalJob:
+    """
+    Wraps an Office COM script in a hidden PowerShell invocation.
+    The script writes `scratch_output` inside `work_dir`; it is published to
+    `output_path` on success (or handed to `finalize_with`, as for
+    linux_office_job) and `work_dir` is removed afterwards.
+    """
+    cmd = ["powershell", "-NoProfile", "-Command", ps_script]
+    # Automation servers that were already running when the job started belong to other jobs
+    running_before: Set[int] = set()
+
+    def reap_com_server() -> None:
+        # COM servers are started by DCOM, not by PowerShell, so killing the tree misses them.
+        # Only servers that appeared after the job started are its own.
+        reap_orphans(com_server, COM_SERVER_MARKERS, spare=running_before)
+
+    @contextmanager
+    def prepare() -> Iterator[List[str]]:
+        with COM_SLOT.slot():
+            running_before.update(com_server_pids(com_server, COM_SERVER_MARKERS))
+            yield cmd
+
+    @asynccontextmanager
+    async def prepare_async() -> AsyncIterator[List[str]]:
+        async with COM_SLOT.slot_async():
+            running_before.update(await asyncio.to_thread(com_server_pids, com_server, COM_SERVER_MARKERS))
+            yield cmd
+
+    @contextmanager
+    def retry() -> Iterator[List[str]]:
+        with COM_SLOT.slot():
+            yield cmd
+
+    def finalize() -> str:
+        if not os.path.exists(scratch_output):
+             raise Exception(f"{label}: output not found at {scratch_output}.")
+        if finalize_with:
+            return finalize_with(scratch_output)
+        return publish(scratch_output, output_path)
+
+    return ExternalJob(label, cmd, finalize, hide_window=True,
+                       timeout=EXTERNAL_TIMEOUTS["powershell"],
+                       on_kill=reap_com_server, retry=retry,
+                       prepare=prepare, prepare_async=prepare_async,
+                       cleanup=lambda: shutil.rmtree(work_dir, ignore_errors=True))
+
+
+# AST builds in flight on the event loop, so concurrent targets of one DOCX share a parse
+_AST_BUILDS: Dict[str, "asyncio.Future"] = {}
+
+def pandoc_ast_job(input_path: str, ast_path: str) -> ExternalJob:
+    """Builds the job that parses a DOCX into pandoc's JSON AST and stores it at ast_path."""
+    import pypandoc
+    tmp_path = f"{ast_path}.{uuid.uuid4().hex[:8]}.tmp"
+    cmd = [pypandoc.get_pandoc_path(), "--from=docx", "--to=json", f"--output={tmp_path}", input_path]
+
+    def finalize() -> str:
+        os.replace(tmp_path, ast_path)  # Readers never see a partial AST
+        pandoc_cache.prune(os.path.dirname(ast_path))
+        return ast_path
+
+    def cleanup() -> None:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    os.makedirs(os.path.dirname(ast_path), exist_ok=True)
+    return ExternalJob("Pandoc parse", cmd, finalize, timeout=EXTERNAL_TIMEOUTS["pandoc"], cleanup=cleanup)
+
+def cached_pandoc_ast(input_path: str) -> str:
+    """Path of input_path's JSON AST, parsing the DOCX only on a cache miss."""
+    import pypandoc
+    ast_path = pandoc_cache.ast_path(input_path, pypandoc.get_pandoc_version())
+    if not pandoc_cache.lookup(ast_path):
+        run_external_job(pandoc_ast_job(input_path, ast_path))
+    return ast_path
+
+async def cached_pandoc_ast_async(input_path: str) -> str:
+    """cached_pandoc_ast() on the event loop. Hashing runs in the default executor."""
+    import pypandoc
+    loop = asyncio.get_running_loop()
+    ast_path = await loop.run_in_executor(None, pandoc_cache.ast_path, input_path,
+                                          pypandoc.get_pandoc_version())
+    if pandoc_cache.lookup(ast_path):
+        return ast_path
+
+    build = _AST_BUILDS.get(ast_path)
+    if build is None:
+        build = asyncio.ensure_future(run_external_job_async(pandoc_ast_job(input_path, ast_path)))
+        _AST_BUILDS[ast_path] = build
+        build.add_done_callback(lambda _: _AST_BUILDS.pop(ast_path, None))
+    return await asyncio.shield(build)
+
+def pandoc_job(input_path: str, to: str, ext: str, from_ast: bool = True) -> ExternalJob:
+    """
+    Builds a pandoc command (binary shipped by pypandoc) writing name_LiteSwitch.ext.
+    With from_ast the output is rendered from the cached JSON AST of the DOCX
+    (see pandoc_cache). The AST does not carry embedded images, so writers that
+    package them (odt) read the DOCX directly instead.
+    """
+    import pypandoc
     base, _ = os.path.splitext(input_path)
-    output_path = f"{base}.{output_format}"
-    
-    # Rename to adhere to LiteSwitch naming convention if needed, or just return it
-    # LiteSwitch convention: name_LiteSwitch.fmt
-    final_output = f"{base}_LiteSwitch.{output_format}"
-    
-    if os.path.exists(output_path):
-        # LibreOffice output name might not match exactly what we want, rename it
-        if os.path.exists(final_output):
-            os.remove(final_output)
-        os.rename(output_path, final_output)
-        return final_output
-    
-    # Sometimes it might already be named correctly if we were lucky? unlikely.
-    if os.path.exists(final_output):
-        return final_output
-        
-    raise Exception("Output file not found after conversion.")
+    output_path = f"{base}_LiteSwitch.{ext}"
+    work_dir = make_scratch_dir()
+    scratch_output = os.path.join(work_dir, os.path.basename(output_path))
+    pandoc = pypandoc.get_pandoc_path()
+    cmd = [pandoc, "--from=docx", f"--to={to}", f"--output={scratch_output}", input_path]
+
+    def render_cmd(ast_path: str) -> List[str]:
+        return [pandoc, "--from=json", f"--to={to}", f"--output={scratch_output}", ast_path]
+
+    @contextmanager
+    def prepare() -> Iterator[List[str]]:
+        yield render_cmd(cached_pandoc_ast(input_path))
+
+    @asynccontextmanager
+    async def prepare_async() -> AsyncIterator[List[str]]:
+        yield render_cmd(await cached_pandoc_ast_async(input_path))
+
+    def finalize() -> str:
+        if not os.path.exists(scratch_output):
+            raise Exception(f"Pandoc did not create {output_path}.")
+        return publish(scratch_output, output_path)
+
+    return ExternalJob("Pandoc conversion", cmd, finalize, timeout=EXTERNAL_TIMEOUTS["pandoc"],
+                       prepare=prepare if from_ast else None,
+                       prepare_async=prepare_async if from_ast else None,
+                       cleanup=lambda: shutil.rmtree(work_dir, ignore_errors=True))
 
-def docx_to_pdf(input_path: str) -> Optional[str]:
+
+def optimized_pdf_publisher(output_path: str, pdf_optimize: Optional[str]) -> Optional[Callable[[str], str]]:
+    """A finalize_with that optimizes the scratch PDF before publishing it (None if no preset)."""
+    if not pdf_optimize:
+        return None
+
+    def finalize(scratch_pdf: str) -> str:
+        return publish(on_fitz_thread(optimize_pdf, scratch_pdf, pdf_optimize), output_path)
+
+    return finalize
+
+
+def docx_to_pdf_job(input_path: str, pdf_optimize: Optional[str] = None) -> ExternalJob:
     """
-    Converts a DOCX file to PDF.
+    Builds the DOCX -> PDF job.
     Windows: Uses PowerShell (COM).
     Linux: Uses LibreOffice.
     """
     if platform.system() == "Linux":
-         return linux_office_convert(input_path, "pdf")
-         
-    """
-    Converts a DOCX file to PDF using PowerShell (bypassing broken pywin32).
-    Uses MS Word via COM from PowerShell.
-    """
-    logger.info(f"Converting DOCX to PDF (via PowerShell): {input_path}")
-    
+         return linux_office_job(input_path, "pdf", pdf_optimize=pdf_optimize)
+
     base, _ = os.path.splitext(input_path)
     output_path = f"{base}_LiteSwitch.pdf"
+    work_dir = make_scratch_dir()
+    scratch_output = os.path.join(work_dir, os.path.basename(output_path))
     
-    # PowerShell script to run Word COM
+    # PowerShell script to run Word COM (bypassing broken pywin32)
     # wdFormatPDF = 17
     ps_script = f"""
     $word = New-Object -ComObject Word.Application
     $word.Visible = $false
     try {{
         $doc = $word.Documents.Open('{input_path}')
-        $doc.ExportAsFixedFormat('{output_path}', 17)
+        $doc.ExportAsFixedFormat('{scratch_output}', 17)
         $doc.Close($false)
     }} finally {{
         $word.Quit()
     }}
     """
-    
+    return powershell_job("PowerShell conversion", ps_script, work_dir, scratch_output, output_path, "WINWORD.EXE",
+                          finalize_with=optimized_pdf_publisher(output_path, pdf_optimize))
+
+
+def docx_to_pdf(input_path: str, pdf_optimize: Optional[str] = None) -> Optional[str]:
+    """Converts a DOCX file to PDF (Word via PowerShell on Windows, LibreOffice on Linux)."""
     try:
-        # Run powershell
-        cmd = ["powershell", "-NoProfile", "-Command", ps_script]
-        
-        # Hide the PowerShell window
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startupinfo)
-        
-        if result.returncode != 0:
-            logger.error(f"PowerShell Error: {result.stderr}")
-            raise Exception(f"PowerShell conversion failed: {result.stderr}")
-            
-        if not os.path.exists(output_path):
-             raise Exception("PDF file was not created by Word.")
-             
-        return output_path
-        
+        job = docx_to_pdf_job(input_path, pdf_optimize)
+        logger.info(f"Converting DOCX to PDF ({job.label}): {input_path}")
+        return run_external_job(job)
     except Exception as e:
         logger.error(f"Error converting {input_path} to PDF: {e}")
         raise e
 
 
+def docx_to_odt_job(input_path: str) -> ExternalJob:  # lossy
+    return pandoc_job(input_path, "odt", "odt", from_ast=False)
+
+
+def docx_to_txt_job(input_path: str) -> ExternalJob:  # lossy
+    return pandoc_job(input_path, "plain", "txt")
+
+
+def docx_to_md_job(input_path: str) -> ExternalJob:
+    return pandoc_job(input_path, "markdown", "md")
+
+
+def docx_to_latex_job(input_path: str) -> ExternalJob:
+    return pandoc_job(input_path, "latex", "tex")
+
+
+def docx_to_html_job(input_path: str) -> ExternalJob:  # lossy
+    return pandoc_job(input_path, "html", "html")
+
+
 def docx_to_odt(input_path: str) -> Optional[str]:  # lossy
-    """Converts DOCX to ODT format using pypandoc"""
+    """Converts DOCX to ODT format using pandoc"""
     try:
-        import pypandoc
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_LiteSwitch.odt"
-        pypandoc.convert_file(input_path, "odt", outputfile=output_path)
-        return output_path
+        return run_external_job(docx_to_odt_job(input_path))
     except Exception as e:
         logger.error(f"Error converting {input_path} to ODT: {e}")
         raise e
 
 
 def docx_to_txt(input_path: str) -> Optional[str]:  # lossy
-    """Converts DOCX to TXT using pypandoc"""
+    """Converts DOCX to TXT using pandoc"""
     try:
-        import pypandoc
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_LiteSwitch.txt"
-        pypandoc.convert_file(input_path, "plain", outputfile=output_path)
-        return output_path
+        return run_external_job(docx_to_txt_job(input_path))
     except Exception as e:
         logger.error(f"Error converting {input_path} to TXT: {e}")
         raise e
 
 
 def docx_to_md(input_path: str) -> Optional[str]:
-    """Converts DOCX to Markdown using pypandoc"""
+    """Converts DOCX to Markdown using pandoc"""
     try:
-        import pypandoc
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_LiteSwitch.md"
-        pypandoc.convert_file(input_path, to="markdown", outputfile=output_path)
-        return output_path
+        return run_external_job(docx_to_md_job(input_path))
     except Exception as e:
         logger.error(f"Error converting {input_path} to Markdown: {e}")
         raise e
 
 
 def docx_to_latex(input_path: str) -> Optional[str]:
-    """Converts DOCX to LaTeX using pypandoc"""
+    """Converts DOCX to LaTeX using pandoc"""
     try:
-        import pypandoc
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_LiteSwitch.tex"
-        pypandoc.convert_file(input_path, to="latex", outputfile=output_path)
-        return output_path
+        return run_external_job(docx_to_latex_job(input_path))
     except Exception as e:
         logger.error(f"Error converting {input_path} to LaTeX: {e}")
         raise e
 
 
 def docx_to_html(input_path: str) -> Optional[str]:  # lossy
-    """Convert DOCX to HTML using pypandoc"""
+    """Convert DOCX to HTML using pandoc"""
     try:
-        import pypandoc
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_LiteSwitch.html"
-        pypandoc.convert_file(input_path, to="html", outputfile=output_path)
-        return output_path
+        return run_external_job(docx_to_html_job(input_path))
     except Exception as e:
         logger.error(f"Error converting {input_path} to HTML: {e}")
         raise e
@@ -187,10 +415,12 @@ def docx_to_html(input_path: str) -> Optional[str]:  # lossy
 def pdf_to_docx(input_path: str) -> Optional[str]:  # lossy
     """Convert PDF to DOCX using pdf2docx"""
     try:
-        from pdf2docx import parse
+        with tracing.span("import", module="pdf2docx"):
+            from pdf2docx import parse
         base, _ = os.path.splitext(input_path)
         output_path = f"{base}_LiteSwitch.docx"
-        parse(input_path, output_path)
+        with staged_output(output_path) as tmp_path, tracing.span("layout"):
+            parse(input_path, tmp_path)
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to DOCX: {e}")
@@ -200,71 +430,146 @@ def pdf_to_docx(input_path: str) -> Optional[str]:  # lossy
 def pdf_to_txt(input_path: str) -> Optional[str]:
     '''Convert PDF to TXT using pdfminer.six'''
     try:
-        from pdfminer.high_level import extract_text
+        with tracing.span("import", module="pdfminer"):
+            from pdfminer.high_level import extract_text
         base, _ = os.path.splitext(input_path)
         output_path = f"{base}_LiteSwitch.txt"
-        text= extract_text(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+        with tracing.span("extract text"):
+            text= extract_text(input_path)
+        with staged_output(output_path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to TXT: {e}")
         raise e
 
 
-def pdf_to_png(input_path: str) -> Optional[str]: 
-    '''Converts PDF to PNG using fitz'''
+def pdf_to_png(input_path: str, raster: Optional[RasterOptions] = None,
+               archive: Optional[str] = None, dedup: bool = True, blank_pages: str = "keep") -> Optional[str]: 
+    '''
+    Converts PDF to PNG (or JPEG/WebP, see RasterOptions) using fitz.
+    With archive="zip"/"tar" the pages go into one name_LiteSwitch_pages.zip/.tar
+    as they are rendered, and its path is returned.
+    With dedup, a page identical to an earlier one is not rendered again: its
+    file is a hard link to the first (a link member in TAR archives).
+    blank_pages="skip"/"collapse" leaves out blank pages (see BlankPageFilter);
+    the remaining files keep their page numbers.
+    '''
     try:
-        import fitz
+        with tracing.span("import", module="fitz"):
+            import fitz
+        options = (raster or RasterOptions()).resolve(PDF_PNG_OPTIONS)
         base, _ = os.path.splitext(input_path)
-        doc = fitz.open(input_path)
+        with tracing.span("open"):
+            doc = fitz.open(input_path)
+        cache = PageCache(options, enabled=dedup)
+        blanks = BlankPageFilter(blank_pages)
         last_output = ""
-        for page_number, page in enumerate(doc, start=1):
-            pix = page.get_pixmap(matrix=fitz.Matrix(3, 3))  # increase resolution
-            output_path = f"{base}_LiteSwitch_page_{page_number}.png"
-            pix.save(output_path)
-            last_output = output_path # returns at least one
+        if archive:
+            output_path = archive_path(f"{base}_LiteSwitch_pages", archive)
+            with partial_output(output_path) as tmp_path, PageArchive(tmp_path, archive) as pages:
+                for page_number, page in enumerate(doc, start=1):
+                    if blanks.drop(page):
+                        continue
+                    name = f"{os.path.basename(base)}_LiteSwitch_page_{page_number}.{options.extension}"
+                    first, repeated = cache.get(page, lambda pix: pages.add(name, options.encode(pix)))
+                    if repeated:
+                        pages.add_link(name, first)
+            doc.close()
+            return output_path
+        with scratch_dir(os.path.getsize(input_path)) as work:
+            for page_number, page in enumerate(doc, start=1):
+                if blanks.drop(page):
+                    continue
+                output_path = f"{base}_LiteSwitch_page_{page_number}.{options.extension}"
+                tmp_path = os.path.join(work, os.path.basename(output_path))
+
+                def save(pix) -> str:
+                    options.save(pix, tmp_path)
+                    return publish(tmp_path, output_path)
+
+                first, repeated = cache.get(page, save)
+                last_output = publish_link(first, output_path) if repeated else first # returns at least one
         doc.close()
+        if cache.hits:
+            logger.info(f"Reused {cache.hits} repeated page(s) of {input_path}")
+        if blanks.dropped:
+            logger.info(f"Left out {blanks.dropped} blank page(s) of {input_path}")
         return last_output # returning the last one just to fit interface
     except Exception as e:
         logger.error(f"Error converting {input_path} to PNG: {e}")
         raise e
 
 
-def pdf_to_html(input_path: str) -> Optional[str]:    #lossy
-    '''Converts PDF to HTML using pymupdf (fitz)'''
+def pdf_to_html(input_path: str, html_images: str = "inline", html_split: bool = False) -> Optional[str]:    #lossy
+    '''
+    Converts PDF to HTML using pymupdf (fitz).
+    html_images="external" writes each distinct image once into name_LiteSwitch_files/
+    and links to it instead of inlining it as base64. html_split (implies external)
+    also puts every page in its own name_LiteSwitch_files/page_N.html, with
+    name_LiteSwitch.html as the index.
+    '''
+    if html_images not in HTML_IMAGE_MODES:
+        raise ValueError(f"Unknown html_images mode: {html_images} (expected one of {', '.join(HTML_IMAGE_MODES)})")
     try:
         import fitz
         base, _ = os.path.splitext(input_path)
         output_path = f"{base}_LiteSwitch.html"
         doc = fitz.open(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for page in doc:
-                f.write(page.get_text("html") + '\n')
+        if html_images == "external" or html_split:
+            files_dir = f"{base}_LiteSwitch_files"
+            with scratch_dir(os.path.getsize(input_path)) as work:
+                scratch_files = os.path.join(work, os.path.basename(files_dir))
+                os.makedirs(scratch_files)
+                scratch_html = os.path.join(work, os.path.basename(output_path))
+                export_pdf_html(doc, scratch_html, scratch_files, split=html_split,
+                                title=os.path.basename(input_path))
+                # The folder first, so the page never links to missing images
+                publish(scratch_files, files_dir)
+                publish(scratch_html, output_path)
+            doc.close()
+            return output_path
+        with staged_output(output_path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for page in doc:
+                    f.write(page.get_text("html") + '\n')
         doc.close()
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to HTML: {e}")
         raise e
 
-def pdf_to_pptx(input_path: str) -> Optional[str]:
+def pdf_to_pptx(input_path: str, raster: Optional[RasterOptions] = None,
+                dedup: bool = True, blank_pages: str = "keep") -> Optional[str]:
     """
     Converts PDF to PPTX using Image-Mode.
     Each page of the PDF is converted to a high-res image and placed on a slide.
     This ensures 100% visual fidelity (fonts, layout) at the cost of editability.
+    `raster` controls the slide images (PPTX cannot embed WebP, so it falls back to PNG).
+    With dedup, repeated pages are rendered once and their slides share one
+    image part (python-pptx stores identical image blobs only once).
+    blank_pages="skip"/"collapse" leaves blank pages out of the deck.
     """
     try:
-        import fitz
-        from pptx import Presentation
-        from pptx.util import Inches
+        with tracing.span("import", module="fitz, pptx"):
+            import fitz
+            from pptx import Presentation
+            from pptx.util import Inches
     except ImportError:
         logger.error("Missing dependencies for PPTX conversion.")
         raise
     
     try:
         logger.info(f"Converting PDF to PPTX (Image Mode): {input_path}")
+        options = (raster or RasterOptions()).resolve(PDF_PPTX_OPTIONS)
+        if options.fmt == "webp":
+            options = dataclasses.replace(options, fmt="png")
         prs = Presentation()
-        doc = fitz.open(input_path)
+        with tracing.span("open"):
+            doc = fitz.open(input_path)
+        cache = PageCache(options, enabled=dedup)
+        blanks = BlankPageFilter(blank_pages)
 
         # Set slide dimensions to match the first page of PDF (optional, but good practice)
         # For simplicity, we usually stick to default or adjust slide size.
@@ -272,43 +577,55 @@ def pdf_to_pptx(input_path: str) -> Optional[str]:
         # but changing slide size affects ALL slides in master. 
         # We'll stick to standard 16:9 or 4:3 and fit the image.
         
-        for page in doc:
-            # Create blank slide (layout 6 is usually blank)
-            slide = prs.slides.add_slide(prs.slide_layouts[6])
+        with scratch_dir() as work:
+            for page in doc:
+                if blanks.drop(page):
+                    continue
+                # Create blank slide (layout 6 is usually blank)
+                slide = prs.slides.add_slide(prs.slide_layouts[6])
             
-            # Rendering high-res image (matrix=2 or 3 for better quality)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
-            img_stream = io.BytesIO(pix.tobytes("png"))
+                # Rendering high-res image (2x by default, see RasterOptions)
+                # The cache keeps only the scratch file of each distinct page, not its bytes
+                image_path = os.path.join(work, f"page_{page.number + 1}.{options.extension}")
+
+                def save(pix):
+                    options.save(pix, image_path)
+                    return image_path, pix.width, pix.height
+
+                (img_path, img_width_px, img_height_px), _ = cache.get(page, save)
             
-            # Calculate fitting
-            # Powerpoint default is usually 10x7.5 inches or 13.33x7.5 (widescreen)
-            slide_width = prs.slide_width
-            slide_height = prs.slide_height
+                # Calculate fitting
+                # Powerpoint default is usually 10x7.5 inches or 13.33x7.5 (widescreen)
+                slide_width = prs.slide_width
+                slide_height = prs.slide_height
             
-            img_width_px = pix.width
-            img_height_px = pix.height
-            img_ratio = img_width_px / img_height_px
-            slide_ratio = slide_width / slide_height
+                img_ratio = img_width_px / img_height_px
+                slide_ratio = slide_width / slide_height
             
-            # Center and Fit
-            if img_ratio > slide_ratio:
-                # Image is wider than slide: fit to width
-                new_width = slide_width
-                new_height = int(new_width / img_ratio)
-                left = 0
-                top = int((slide_height - new_height) / 2)
-            else:
-                # Image is taller/boxier: fit to height
-                new_height = slide_height
-                new_width = int(new_height * img_ratio)
-                top = 0
-                left = int((slide_width - new_width) / 2)
+                # Center and Fit
+                if img_ratio > slide_ratio:
+                    # Image is wider than slide: fit to width
+                    new_width = slide_width
+                    new_height = int(new_width / img_ratio)
+                    left = 0
+                    top = int((slide_height - new_height) / 2)
+                else:
+                    # Image is taller/boxier: fit to height
+                    new_height = slide_height
+                    new_width = int(new_height * img_ratio)
+                    top = 0
+                    left = int((slide_width - new_width) / 2)
             
-            slide.shapes.add_picture(img_stream, left, top, width=new_width, height=new_height)
+                slide.shapes.add_picture(img_path, left, top, width=new_width, height=new_height)
 
+        if cache.hits:
+            logger.info(f"Reused {cache.hits} repeated page(s) of {input_path}")
+        if blanks.dropped:
+            logger.info(f"Left out {blanks.dropped} blank page(s) of {input_path}")
         base, _ = os.path.splitext(input_path)
         output_path = f"{base}_LiteSwitch.pptx"
-        prs.save(output_path)
+        with staged_output(output_path) as tmp_path, tracing.span("save"):
+            prs.save(tmp_path)
         return output_path
     
     except Exception as e:
@@ -316,6 +633,24 @@ def pdf_to_pptx(input_path: str) -> Optional[str]:
         raise e
 
 
+def page_markdown(blocks) -> str:
+    """Turns one page's text blocks (page.get_text("blocks")) into rough Markdown."""
+    markdown_content = ""
+    for block in blocks:
+        text = block[4].strip()
+        if not text:
+            continue
+        
+        if len(text.splitlines()) == 1 and len(text) < 80:
+            markdown_content += f"\n## {text}\n"
+        elif text.endswith('.') or text.endswith('?') or text.endswith('!'):
+            markdown_content += f"{text}\n"
+        else:
+            markdown_content += f"{text}\n\n"
+    
+    return markdown_content + "---\n\n"
+
+
 def pdf_to_md(input_path: str) -> Optional[str]:
     '''Converts PDF to Markdown using unstructured'''
     try:
@@ -329,56 +664,140 @@ def pdf_to_md(input_path: str) -> Optional[str]:
 
         for pageNum in range(len(doc)):
             page = doc.load_page(pageNum)
-            blocks = page.get_text("blocks")
-
-            for block in blocks:
-                text = block[4].strip()
-                if not text:
-                    continue
-                
-                if len(text.splitlines()) == 1 and len(text) < 80:
-                    markdown_content += f"\n## {text}\n"
-                elif text.endswith('.') or text.endswith('?') or text.endswith('!'):
-                    markdown_content += f"{text}\n"
-                else:
-                    markdown_content += f"{text}\n\n"
-            
-            markdown_content += "---\n\n"
+            markdown_content += page_markdown(page.get_text("blocks"))
             
         doc.close()
         final_markdown = md(markdown_content)
         
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(final_markdown)
+        with staged_output(output_path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(final_markdown)
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to Markdown: {e}")
         raise e
 
 
-def png_to_pdf(input_path: str) -> Optional[str]:
+# Targets pdf_to_many can produce from a single walk over the pages
+PDF_FANOUT_TARGETS = ("png", "txt", "md")
+
+def pdf_to_many(input_path: str, targets: List[str], raster: Optional[RasterOptions] = None,
+                archive: Optional[str] = None, dedup: bool = True, blank_pages: str = "keep") -> Dict[str, str]:
+    """
+    Produces several PDF_FANOUT_TARGETS in one pass: the document is opened
+    once, each page is loaded once, and its text is extracted once (one fitz
+    TextPage feeds the txt and md writers) while the rasterizer renders
+    the same page object. Costs about as much as the most expensive target alone.
+    Unlike pdf_to_txt (pdfminer), text comes from fitz; pages are separated by a
+    form feed as pdfminer does. `archive`, `dedup` and `blank_pages` apply to the
+    images as in pdf_to_png.
+    Returns {target: output path}.
+    """
+    with tracing.span("import", module="fitz"):
+        import fitz
+    unknown = set(targets) - set(PDF_FANOUT_TARGETS)
+    if unknown:
+        raise ValueError(f"Cannot produce {', '.join(sorted(unknown))} in a single pass")
+
+    logger.info(f"Converting PDF to {', '.join(targets)} in one pass: {input_path}")
+    base, _ = os.path.splitext(input_path)
+    final = {t: f"{base}_LiteSwitch.{t}" for t in targets if t != "png"}
+    options = (raster or RasterOptions()).resolve(PDF_PNG_OPTIONS)
+    cache = PageCache(options, enabled=dedup)
+    blanks = BlankPageFilter(blank_pages)
+    needs_text = "txt" in targets or "md" in targets
+    outputs: Dict[str, str] = {}
+
+    try:
+        with ExitStack() as stack:
+            work = stack.enter_context(scratch_dir(os.path.getsize(input_path)))
+            with tracing.span("open"):
+                doc = fitz.open(input_path)
+            stack.callback(doc.close)
+            scratch = {t: os.path.join(work, os.path.basename(path)) for t, path in final.items()}
+            txt_file = stack.enter_context(open(scratch["txt"], "w", encoding="utf-8")) if "txt" in targets else None
+            markdown_content = ""
+            pages = None
+            if "png" in targets and archive:
+                png_archive = archive_path(f"{base}_LiteSwitch_pages", archive)
+                # Renamed into place when the stack unwinds without an error
+                pages = PageArchive(stack.enter_context(partial_output(png_archive)), archive)
+                stack.callback(pages.close)
+
+            for page_number, page in enumerate(doc, start=1):
+                if "png" in targets and not blanks.drop(page):
+                    output_path = f"{base}_LiteSwitch_page_{page_number}.{options.extension}"
+                    name = os.path.basename(output_path)
+                    tmp_path = os.path.join(work, name)
+                    if pages:
+                        first, repeated = cache.get(page, lambda pix: pages.add(name, options.encode(pix)))
+                        if repeated:
+                            pages.add_link(name, first)
+                    else:
+                        def save(pix) -> str:
+                            options.save(pix, tmp_path)
+                            return publish(tmp_path, output_path)
+
+                        first, repeated = cache.get(page, save)
+                        outputs["png"] = publish_link(first, output_path) if repeated else first
+                if not needs_text:
+                    continue
+
+                with tracing.span("extract text", page=page.number):
+                    textpage = page.get_textpage()
+                if txt_file:
+                    txt_file.write(page.get_text("text", textpage=textpage) + "\f")
+                if "md" in targets:
+                    markdown_content += page_markdown(page.get_text("blocks", textpage=textpage))
+
+            if pages:
+                pages.close()
+                outputs["png"] = os.path.abspath(png_archive)
+            if txt_file:
+                txt_file.close()
+            if "md" in targets:
+                from markdownify import markdownify as md
+                with open(scratch["md"], "w", encoding="utf-8") as f:
+                    f.write(md(markdown_content))
+            for target, path in final.items():
+                outputs[target] = publish(scratch[target], path)
+        return outputs
+    except Exception as e:
+        logger.error(f"Error converting {input_path} to {', '.join(targets)}: {e}")
+        raise e
+
+
+def png_to_pdf(input_path: str, pdf_optimize: Optional[str] = None) -> Optional[str]:
     try:
         from PIL import Image
         logger.info("opening the first image")
         first_image = Image.open(input_path).convert("RGB")
         output_path = f"{os.path.splitext(input_path)[0]}_LiteSwitch.pdf"
-        first_image.save(output_path, save_all=True, dpi=(300, 300))
+        with staged_output(output_path) as tmp_path:
+            first_image.save(tmp_path, save_all=True, dpi=(300, 300))
+            if pdf_optimize:
+                optimize_pdf(tmp_path, pdf_optimize)
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to PDF: {e}")
         raise e
 
 
-def pptx_to_pdf(input_path: str) -> Optional[str]:
-    """Converts PPTX to PDF."""
+def pptx_to_pdf_job(input_path: str, finalize_with: Optional[Callable[[str], str]] = None,
+                    pdf_optimize: Optional[str] = None) -> ExternalJob:
+    """
+    Builds the PPTX -> PDF job (PowerPoint via PowerShell, LibreOffice on Linux).
+    `finalize_with` receives the scratch PDF instead of it being published;
+    otherwise the PDF is optimized with the `pdf_optimize` preset, if given.
+    """
     if platform.system() == "Linux":
-        return linux_office_convert(input_path, "pdf")
+        return linux_office_job(input_path, "pdf", finalize_with=finalize_with, pdf_optimize=pdf_optimize)
 
-    """Converts PPTX to PDF using PowerShell (COM)."""
-    logger.info(f"Converting PPTX to PDF: {input_path}")
-    
     base, _ = os.path.splitext(input_path)
     output_path = f"{base}_LiteSwitch.pdf"
+    finalize_with = finalize_with or optimized_pdf_publisher(output_path, pdf_optimize)
+    work_dir = make_scratch_dir()
+    scratch_output = os.path.join(work_dir, os.path.basename(output_path))
     
     # ppSaveAsPDF = 32
     ps_script = f"""
@@ -391,7 +810,7 @@ def pptx_to_pdf(input_path: str) -> Optional[str]:
     
     try {{
         $pres = $ppt.Presentations.Open('{input_path}', [Microsoft.Office.Core.MsoTriState]::msoTrue, [Microsoft.Office.Core.MsoTriState]::msoFalse, [Microsoft.Office.Core.MsoTriState]::msoFalse)
-        $pres.SaveAs('{output_path}', 32)
+        $pres.SaveAs('{scratch_output}', 32)
         $pres.Close()
     }} catch {{
         Write-Error $_.Exception.Message
@@ -401,69 +820,63 @@ def pptx_to_pdf(input_path: str) -> Optional[str]:
         [System.Runtime.Interopservices.Marshal]::ReleaseComObject($ppt) | Out-Null
     }}
     """
-    
+    return powershell_job("PPTX->PDF", ps_script, work_dir, scratch_output, output_path, "POWERPNT.EXE",
+                          finalize_with=finalize_with)
+
+
+def pptx_to_pdf(input_path: str, pdf_optimize: Optional[str] = None) -> Optional[str]:
+    """Converts PPTX to PDF."""
+    logger.info(f"Converting PPTX to PDF: {input_path}")
     try:
-        cmd = ["powershell", "-NoProfile", "-Command", ps_script]
-        
-        # Hide the PowerShell window
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startupinfo)
-        
-        if result.returncode != 0:
-             logger.error(f"PowerShell Error: {result.stderr}")
-             raise Exception(f"PPTX->PDF failed: {result.stderr}")
-             
-        if not os.path.exists(output_path):
-             raise Exception("Output PDF not found.")
-             
-        return output_path
+        return run_external_job(pptx_to_pdf_job(input_path, pdf_optimize=pdf_optimize))
     except Exception as e:
         logger.error(f"Error converting {input_path} to PDF: {e}")
         raise e
 
-def pptx_to_png(input_path: str) -> Optional[str]:
-    """Converts PPTX slides to PNG images. Returns folder path."""
-    if platform.system() == "Linux":
-        # Strategy: PPTX -> PDF -> PNG
-        pdf_path = pptx_to_pdf(input_path)
-        if pdf_path:
-            # We reuse the existing pdf_to_png logic but that returns a single file path usually?
-            # actually pdf_to_png in this file returns "last_output" but saves all pages.
-            # We want to return a folder or similar behavior to Windows?
-            # Windows implementation returns a FOLDER path.
-            
-            # Let's create a folder
-            base, _ = os.path.splitext(input_path)
-            output_dir = f"{base}_LiteSwitch_Slides"
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            # Use fitz manually here to control output location matches Windows behavior
-            import fitz
-            doc = fitz.open(pdf_path)
-            for i, page in enumerate(doc, start=1):
-                pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
-                pix.save(f"{output_dir}/Slide_{i}.png")
-            doc.close()
-            return output_dir
-
-    """Converts PPTX slides to PNG images (PowerShell). Returns folder path."""
-    logger.info(f"Converting PPTX to PNGs: {input_path}")
-    
+def pptx_to_png_job(input_path: str, raster: Optional[RasterOptions] = None,
+                    archive: Optional[str] = None, blank_pages: str = "keep") -> ExternalJob:
+    """
+    Builds the PPTX -> PNG slides job. The result is a folder path, or with
+    archive="zip"/"tar" the path of one name_LiteSwitch_Slides.zip/.tar.
+    blank_pages="skip"/"collapse" leaves out blank slides (Slide_N keeps its number).
+    On Windows, PowerPoint does the export itself, so only the size (box) and
+    PNG/JPEG format of `raster` apply there (blank slides are kept), and its
+    files are packed afterwards.
+    """
+    options = (raster or RasterOptions()).resolve(SLIDE_PNG_OPTIONS)
     base, _ = os.path.splitext(input_path)
-    # Output to a folder
+    # Output to a folder (mirrors the Windows behaviour on every platform)
     output_dir = f"{base}_LiteSwitch_Slides"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+
+    if platform.system() == "Linux":
+        # Strategy: PPTX -> PDF (LibreOffice) -> PNG (fitz), all inside scratch space.
+        # The intermediate PDF is never published; slides are rasterized in
+        # parallel as soon as it exists, at the size Windows exports them.
+        def rasterize(pdf_path: str) -> str:
+            # Blank slides are found on small previews before the workers render the rest.
+            # Only that runs on the fitz thread; rendering happens in worker processes.
+            pages = on_fitz_thread(select_pages, pdf_path, blank_pages)
+            if archive:
+                output_path = archive_path(output_dir, archive)
+                with partial_output(output_path) as tmp_path, PageArchive(tmp_path, archive) as slides:
+                    for page_number, data in iter_encoded_pages(pdf_path, options, pages=pages, in_process=False):
+                        slides.add(f"Slide_{page_number}.{options.extension}", data)
+                return os.path.abspath(output_path)
+            slides_dir = os.path.join(os.path.dirname(pdf_path), os.path.basename(output_dir))
+            os.makedirs(slides_dir)
+            render_pdf_pages(pdf_path, slides_dir, f"Slide_{{}}.{options.extension}", options, pages=pages,
+                             in_process=False)
+            return publish(slides_dir, output_dir)
+
+        return linux_office_job(input_path, "pdf", finalize_with=rasterize)
+
+    work_dir = make_scratch_dir()
+    scratch_output = os.path.join(work_dir, os.path.basename(output_dir))
+    os.makedirs(scratch_output)
+    export_size = options.box or SLIDE_PNG_SIZE
+    export_filter, export_ext = ("JPG", "jpg") if options.fmt == "jpeg" else ("PNG", "png")
         
-    # We output to the folder. PowerPoint SaveAs PNG saves *every* slide.
-    # ppSaveAsPNG = 18
-    # Note: SaveAs with PNG format typically creates a folder if it's a presentation, 
-    # OR we can export slide by slide. SaveAs is easiest.
-    
+    # We export slide by slide; SaveAs PNG (ppSaveAsPNG = 18) would pick the folder name itself.
     ps_script = f"""
     $ppt = New-Object -ComObject PowerPoint.Application
     $ppt.Visible = [Microsoft.Office.Core.MsoTriState]::msoTrue
@@ -471,15 +884,10 @@ def pptx_to_png(input_path: str) -> Optional[str]:
     
     try {{
         $pres = $ppt.Presentations.Open('{input_path}', [Microsoft.Office.Core.MsoTriState]::msoTrue, [Microsoft.Office.Core.MsoTriState]::msoFalse, [Microsoft.Office.Core.MsoTriState]::msoFalse)
-        # SaveAs with PNG(18) creates a Folder 'Filename' containing Slide1.PNG, Slide2.PNG...
-        # We want to control the name, but let's see. 
-        # If we target '.../Folder/Slide.png', it might save first slide?
-        # Actually Export is better for slides.
-        
         $i = 1
         foreach ($slide in $pres.Slides) {{
-            $out = "{output_dir}\\Slide_$i.png"
-            $slide.Export($out, "PNG", 1920, 1080)
+            $out = "{scratch_output}\\Slide_$i.{export_ext}"
+            $slide.Export($out, "{export_filter}", {export_size[0]}, {export_size[1]})
             $i++
         }}
         $pres.Close()
@@ -491,30 +899,37 @@ def pptx_to_png(input_path: str) -> Optional[str]:
         [System.Runtime.Interopservices.Marshal]::ReleaseComObject($ppt) | Out-Null
     }}
     """
-    
+    def pack(slides_dir: str) -> str:
+        output_path = archive_path(output_dir, archive)
+        with partial_output(output_path) as tmp_path:
+            pack_directory(slides_dir, tmp_path, archive)
+        return os.path.abspath(output_path)
+
+    return powershell_job("PPTX->PNG", ps_script, work_dir, scratch_output, output_dir, "POWERPNT.EXE",
+                          finalize_with=pack if archive else None)
+
+
+def pptx_to_png(input_path: str, raster: Optional[RasterOptions] = None,
+                archive: Optional[str] = None, blank_pages: str = "keep") -> Optional[str]:
+    """Converts PPTX slides to PNG images. Returns folder (or archive) path."""
+    logger.info(f"Converting PPTX to PNGs: {input_path}")
     try:
-        cmd = ["powershell", "-NoProfile", "-Command", ps_script]
-        
-        # Hide the PowerShell window
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        startupinfo.wShowWindow = subprocess.SW_HIDE
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startupinfo)
-        
-        if result.returncode != 0:
-             logger.error(f"PowerShell Error: {result.stderr}")
-             raise Exception(f"PPTX->PNG failed: {result.stderr}")
-             
-        return output_dir
+        return run_external_job(pptx_to_png_job(input_path, raster, archive, blank_pages))
     except Exception as e:
         logger.error(f"Error converting {input_path} to PNG: {e}")
         raise e
 
+def pptx_to_txt_job(input_path: str) -> Optional[ExternalJob]:
+    """LibreOffice job on Linux; elsewhere the text is extracted in-process (None)."""
+    if platform.system() == "Linux":
+        return linux_office_job(input_path, "txt")
+    return None
+
 def pptx_to_txt(input_path: str) -> Optional[str]:
     """Extracts text from PPTX using python-pptx."""
-    if platform.system() == "Linux":
-         return linux_office_convert(input_path, "txt")
+    job = pptx_to_txt_job(input_path)
+    if job:
+         return run_external_job(job)
          
     try:
         from pptx import Presentation
@@ -530,18 +945,26 @@ def pptx_to_txt(input_path: str) -> Optional[str]:
                 if hasattr(shape, "text"):
                     text_runs.append(shape.text)
                     
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(text_runs))
+        with staged_output(output_path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(text_runs))
             
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to TXT: {e}")
         raise e
 
+def pptx_to_docx_job(input_path: str) -> Optional[ExternalJob]:
+    """LibreOffice job on Linux; elsewhere the handout is built in-process (None)."""
+    if platform.system() == "Linux":
+        return linux_office_job(input_path, "docx")
+    return None
+
 def pptx_to_docx(input_path: str) -> Optional[str]:
     """Converts PPTX text to DOCX."""
-    if platform.system() == "Linux":
-         return linux_office_convert(input_path, "docx")
+    job = pptx_to_docx_job(input_path)
+    if job:
+         return run_external_job(job)
 
     try:
         from pptx import Presentation
@@ -568,13 +991,133 @@ def pptx_to_docx(input_path: str) -> Optional[str]:
                     if clean_text.strip():
                         doc.add_paragraph(clean_text)
         
-        doc.save(output_path)
+        with staged_output(output_path) as tmp_path:
+            doc.save(tmp_path)
         return output_path
     except Exception as e:
         logger.error(f"Error converting {input_path} to DOCX: {e}")
         raise e
 
 
+THUMBNAIL_SIZE = (256, 256)
+
+def thumbnail_path(input_path: str, page_number: int, ext: str, thumbnail_dir: Optional[str] = None) -> str:
+    """
+    name_LiteSwitch_thumb.png (page 1) / name_LiteSwitch_thumb_page_N.png next to the input.
+    In thumbnail_dir the name also carries a short hash of the input's folder,
+    so a/report.pdf and b/report.pdf do not overwrite each other's thumbnails.
+    """
+    base, _ = os.path.splitext(input_path)
+    if thumbnail_dir:
+        folder = hashlib.sha1(os.path.dirname(os.path.abspath(input_path)).encode("utf-8")).hexdigest()[:8]
+        base = os.path.join(thumbnail_dir, f"{os.path.basename(base)}_{folder}")
+    suffix = "" if page_number == 1 else f"_page_{page_number}"
+    return f"{base}_LiteSwitch_thumb{suffix}.{ext}"
+
+def _thumbnail_options(raster: Optional[RasterOptions], box) -> RasterOptions:
+    # The bounding box always wins over a DPI given for full-size renders
+    return dataclasses.replace((raster or RasterOptions()).resolve(BASE_OPTIONS), box=tuple(box), dpi=None)
+
+def render_pdf_thumbnails(pdf_path: str, input_path: str, box, pages: int,
+                          thumbnail_dir: Optional[str], raster: Optional[RasterOptions]) -> str:
+    """Renders the first `pages` pages of pdf_path scaled into `box`. Returns the first thumbnail."""
+    import fitz
+    options = _thumbnail_options(raster, box)
+    first = None
+    doc = fitz.open(pdf_path)
+    try:
+        for page_number in range(min(pages, doc.page_count)):
+            # Scaled rendering: MuPDF rasterizes straight at thumbnail size
+            pix = options.render(doc.load_page(page_number))
+            path = thumbnail_path(input_path, page_number + 1, options.extension, thumbnail_dir)
+            with staged_output(path) as tmp_path:
+                options.save(pix, tmp_path)
+            first = first or path
+    finally:
+        doc.close()
+    if first is None:
+        raise Exception("Document has no pages.")
+    return first
+
+def pdf_to_thumbnail(input_path: str, thumbnail_box=THUMBNAIL_SIZE, thumbnail_pages: int = 1,
+                     thumbnail_dir: Optional[str] = None, raster: Optional[RasterOptions] = None) -> Optional[str]:
+    """Renders a small preview of the first page(s) of a PDF."""
+    try:
+        return render_pdf_thumbnails(input_path, input_path, thumbnail_box, thumbnail_pages, thumbnail_dir, raster)
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for {input_path}: {e}")
+        raise e
+
+def pptx_to_thumbnail(input_path: str, thumbnail_box=THUMBNAIL_SIZE, thumbnail_pages: int = 1,
+                      thumbnail_dir: Optional[str] = None, raster: Optional[RasterOptions] = None) -> Optional[str]:
+    """
+    Renders a small preview of the first slide(s).
+    Cheapest route first: PowerPoint stores a first-slide preview in
+    docProps/thumbnail.jpeg, which is used if it is big enough. Otherwise the
+    deck goes through the office suite to a scratch PDF and is rendered from there.
+    """
+    try:
+        if thumbnail_pages == 1:
+            embedded = _embedded_pptx_thumbnail(input_path, thumbnail_box, thumbnail_dir, raster)
+            if embedded:
+                return embedded
+
+        def render(pdf_path: str) -> str:
+            return render_pdf_thumbnails(pdf_path, input_path, thumbnail_box, thumbnail_pages, thumbnail_dir, raster)
+
+        return run_external_job(pptx_to_pdf_job(input_path, finalize_with=render))
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for {input_path}: {e}")
+        raise e
+
+def _embedded_pptx_thumbnail(input_path: str, box, thumbnail_dir: Optional[str],
+                             raster: Optional[RasterOptions]) -> Optional[str]:
+    """Uses the preview image inside an OOXML package; None if missing or too small."""
+    import zipfile
+    from PIL import Image
+    try:
+        with zipfile.ZipFile(input_path) as package:
+            data = package.read("docProps/thumbnail.jpeg")
+    except (zipfile.BadZipFile, KeyError):
+        return None
+
+    img = Image.open(io.BytesIO(data))
+    if img.width < box[0] and img.height < box[1]:
+        return None
+    return _save_thumbnail_image(img, input_path, box, thumbnail_dir, raster)
+
+def _save_thumbnail_image(img, input_path: str, box, thumbnail_dir: Optional[str],
+                          raster: Optional[RasterOptions]) -> str:
+    options = _thumbnail_options(raster, box)
+    img.draft("RGB", tuple(box))  # JPEG: decode at a reduced scale, no-op for other formats
+    img.thumbnail(tuple(box), reducing_gap=2.0)
+    if options.grayscale:
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L") and not (options.alpha and options.fmt != "jpeg"):
+        img = img.convert("RGB")
+
+    path = thumbnail_path(input_path, 1, options.extension, thumbnail_dir)
+    with staged_output(path) as tmp_path:
+        if options.fmt == "jpeg":
+            img.save(tmp_path, "JPEG", quality=options.quality)
+        elif options.fmt == "webp":
+            img.save(tmp_path, "WEBP", quality=options.quality)
+        else:
+            img.save(tmp_path, "PNG", compress_level=options.compression if options.compression is not None else 6)
+    return path
+
+def png_to_thumbnail(input_path: str, thumbnail_box=THUMBNAIL_SIZE, thumbnail_dir: Optional[str] = None,
+                     raster: Optional[RasterOptions] = None) -> Optional[str]:
+    """Scales an image down to fit the thumbnail box."""
+    try:
+        from PIL import Image
+        with Image.open(input_path) as img:
+            return _save_thumbnail_image(img, input_path, thumbnail_box, thumbnail_dir, raster)
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for {input_path}: {e}")
+        raise e
+
+
 CONVERSION_MAP: Dict[str, Dict[str, Callable[[str], Optional[str]]]] = {
     "docx": {
         "pdf": docx_to_pdf,
@@ -582,6 +1125,7 @@ CONVERSION_MAP: Dict[str, Dict[str, Callable[[str], Optional[str]]]] = {
         "txt": docx_to_txt,
         "md": docx_to_md,
         "tex": docx_to_latex,
+        "html": docx_to_html,
     },
     "pdf": {
         "docx": pdf_to_docx,
@@ -589,20 +1133,97 @@ CONVERSION_MAP: Dict[str, Dict[str, Callable[[str], Optional[str]]]] = {
         "pptx": pdf_to_pptx,
         "txt": pdf_to_txt,
         "md": pdf_to_md,
+        "thumbnail": pdf_to_thumbnail,
     },
     "pptx": {
         "pdf": pptx_to_pdf,
         "png": pptx_to_png,
         "txt": pptx_to_txt,
         "docx": pptx_to_docx,
+        "thumbnail": pptx_to_thumbnail,
     },
     "ppt": {
         "pdf": pptx_to_pdf,
         "png": pptx_to_png,
         "txt": pptx_to_txt,
         "docx": pptx_to_docx,
+        "thumbnail": pptx_to_thumbnail,
     },
     "png":{
-        "pdf": png_to_pdf
+        "pdf": png_to_pdf,
+        "thumbnail": png_to_thumbnail,
     }
 }
+
+
+# Conversions that (on this platform) are carried out by an external program.
+# Each builder returns an ExternalJob, or None when the conversion runs in-process.
+EXTERNAL_JOB_MAP: Dict[str, Dict[str, Callable[[str], Optional[ExternalJob]]]] = {
+    "docx": {
+        "pdf": docx_to_pdf_job,
+        "odt": docx_to_odt_job,
+        "txt": docx_to_txt_job,
+        "md": docx_to_md_job,
+        "tex": docx_to_latex_job,
+        "html": docx_to_html_job,
+    },
+    "pptx": {
+        "pdf": pptx_to_pdf_job,
+        "png": pptx_to_png_job,
+        "txt": pptx_to_txt_job,
+        "docx": pptx_to_docx_job,
+    },
+    "ppt": {
+        "pdf": pptx_to_pdf_job,
+        "png": pptx_to_png_job,
+        "txt": pptx_to_txt_job,
+        "docx": pptx_to_docx_job,
+    },
+}
+
+
+def accepted_options(func: Callable, options: Dict[str, object]) -> Dict[str, object]:
+    """Keeps the keyword options `func` accepts, so one option set can go to any converter."""
+    params = inspect.signature(func).parameters
+    return {k: v for k, v in options.items() if k in params and v is not None}
+
+
+def parse_targets(target_ext: str) -> List[str]:
+    """'PNG, .txt,md' -> ['png', 'txt', 'md']"""
+    targets = [t.strip().lower().lstrip('.') for t in target_ext.split(",") if t.strip()]
+    if not targets:
+        raise ValueError("No target format given")
+    return list(dict.fromkeys(targets))
+
+
+def split_targets(source_ext: str, targets: List[str]) -> Tuple[List[str], List[str]]:
+    """Splits targets into (produced together by pdf_to_many, converted one by one)."""
+    shared = [t for t in targets if t in PDF_FANOUT_TARGETS] if source_ext == "pdf" else []
+    if len(shared) < 2:
+        shared = []
+    return shared, [t for t in targets if t not in shared]
+
+
+def convert(input_path: str, target_ext: str, **options):
+    """
+    Converts input_path to target_ext, passing each converter the options it
+    understands (e.g. raster=RasterOptions(...)) and ignoring the rest.
+    A comma-separated target ("png,txt,md") returns {target: output path};
+    page-based PDF targets are then produced in a single pass.
+    """
+    source_ext = os.path.splitext(input_path)[1].lower().lstrip('.')
+    targets = parse_targets(target_ext)
+    for target in targets:
+        if source_ext not in CONVERSION_MAP or target not in CONVERSION_MAP[source_ext]:
+            raise ValueError(f"Cannot convert .{source_ext} to .{target}")
+
+    if len(targets) == 1:
+        converter = CONVERSION_MAP[source_ext][targets[0]]
+        with tracing.span(converter.__name__, cat="job", input=os.path.basename(input_path)):
+            return converter(input_path, **accepted_options(converter, options))
+
+    shared, separate = split_targets(source_ext, targets)
+    outputs = pdf_to_many(input_path, shared, **accepted_options(pdf_to_many, options)) if shared else {}
+    for target in separate:
+        outputs[target] = convert(input_path, target, **options)
+    return outputs
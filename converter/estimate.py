@@ -0,0 +1,315 @@
+"""
+Cost estimates for a batch before it runs (cli.py --estimate).
+
+Each input is described from cheap metadata only (page/slide counts, image
+counts, file size; nothing is rendered or converted). Time and output size
+per conversion come from throughput learned from past runs, stored in
+~/.cache/liteswitch/throughput.json, or from built-in rates until there is
+history. Peak memory comes from admission.estimate_job_memory(), and the
+batch's wall time from replaying the scheduler (job limit, memory budget)
+with the running jobs sharing the CPU cores.
+"""
+
+import os
+import re
+import json
+import struct
+import logging
+import zipfile
+import tempfile
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from converter.admission import estimate_job_memory, pdf_geometry, JOB_BASE_BYTES, MIB
+
+logger = logging.getLogger(__name__)
+
+KIB = 1024
+HISTORY_CAP = 200          # Runs per conversion after which older history is halved
+DOCX_BYTES_PER_PAGE = 20 * KIB  # When a DOCX does not record its page count
+
+# (fixed seconds, seconds per unit, output bytes per unit) before anything is learned.
+# Units: PDF pages, PPTX slides, DOCX pages, PNG megapixels, MiB for anything else.
+DEFAULT_RATES: Dict[str, Tuple[float, float, float]] = {
+    "pdf:png": (0.3, 0.25, 400 * KIB),
+    "pdf:pptx": (1.0, 0.2, 250 * KIB),
+    "pdf:docx": (1.0, 0.5, 60 * KIB),
+    "pdf:txt": (0.3, 0.02, 3 * KIB),
+    "pdf:md": (0.3, 0.02, 3 * KIB),
+    "pdf:thumbnail": (0.2, 0.0, 0),
+    "docx:pdf": (4.0, 0.2, 50 * KIB),
+    "pptx:pdf": (5.0, 0.3, 100 * KIB),
+    "pptx:png": (5.0, 0.4, 300 * KIB),
+    "pptx:txt": (3.0, 0.05, 1 * KIB),
+    "pptx:docx": (5.0, 0.2, 50 * KIB),
+    "pptx:thumbnail": (0.5, 0.0, 0),
+    "png:pdf": (0.3, 0.1, 300 * KIB),
+    "png:thumbnail": (0.1, 0.02, 0),
+}
+DEFAULT_RATE = (1.0, 0.05, 5 * KIB)  # Text exports (pandoc) and anything not listed
+THUMBNAIL_BYTES = 20 * KIB
+
+
+class InputInfo(NamedTuple):
+    source_ext: str
+    size: int
+    units: float      # Amount of work, in `unit`s
+    unit: str         # "pages", "slides", "MP" or "MiB"
+    images: int
+
+
+class JobEstimate(NamedTuple):
+    input_path: str
+    target_ext: str
+    info: InputInfo
+    seconds: float
+    memory: int
+    output_bytes: int
+    runs: int         # Past runs the rates were learned from (0: built-in rates)
+
+
+def default_stats_path() -> str:
+    """$LITESWITCH_STATS_PATH, else ~/.cache/liteswitch/throughput.json (honours XDG_CACHE_HOME)."""
+    override = os.environ.get("LITESWITCH_STATS_PATH")
+    if override:
+        return override
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "liteswitch", "throughput.json")
+
+
+def _png_megapixels(path: str) -> float:
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError(f"Not a PNG: {path}")
+    width, height = struct.unpack(">II", header[16:24])
+    return width * height / 1e6
+
+
+def _zip_stats(path: str, media_prefix: str) -> Tuple[List[str], int]:
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+    return names, sum(1 for n in names if n.startswith(media_prefix))
+
+
+def _docx_pages(path: str, size: int) -> int:
+    """Page count Word/LibreOffice recorded in docProps/app.xml, else a guess from the size."""
+    with zipfile.ZipFile(path) as zf:
+        try:
+            app = zf.read("docProps/app.xml").decode("utf-8", "replace")
+        except KeyError:
+            app = ""
+    match = re.search(r"<Pages>(\d+)</Pages>", app)
+    return int(match.group(1)) if match else 1 + size // DOCX_BYTES_PER_PAGE
+
+
+def describe_input(input_path: str, count_images: bool = True) -> InputInfo:
+    """
+    Reads the metadata estimates are made from, without rendering or converting
+    anything. Without `count_images`, a PDF's page count comes from
+    pdf_geometry() (cached) instead of a pass over every page; images is then 0.
+    """
+    source_ext = os.path.splitext(input_path)[1].lower().lstrip('.')
+    size = os.path.getsize(input_path)
+    if source_ext == "pdf":
+        if not count_images:
+            return InputInfo(source_ext, size, pdf_geometry(input_path)[0], "pages", 0)
+        import fitz
+        with fitz.open(input_path) as doc:
+            images = sum(len(page.get_images()) for page in doc)
+            return InputInfo(source_ext, size, doc.page_count, "pages", images)
+    if source_ext == "pptx":
+        names, images = _zip_stats(input_path, "ppt/media/")
+        slides = sum(1 for n in names if re.fullmatch(r"ppt/slides/slide\d+\.xml", n))
+        return InputInfo(source_ext, size, slides, "slides", images)
+    if source_ext == "docx":
+        _, images = _zip_stats(input_path, "word/media/")
+        return InputInfo(source_ext, size, _docx_pages(input_path, size), "pages", images)
+    if source_ext == "png":
+        return InputInfo(source_ext, size, _png_megapixels(input_path), "MP", 1)
+    return InputInfo(source_ext, size, size / MIB, "MiB", 0)
+
+
+def output_bytes(result: Union[str, Dict[str, str], None], units: float) -> int:
+    """Disk space a converter's result takes."""
+    if isinstance(result, dict):
+        return sum(output_bytes(path, units) for path in result.values())
+    if not result or not os.path.exists(result):
+        return 0
+    if os.path.isdir(result):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(result) for name in names)
+    if "_LiteSwitch_page_" in os.path.basename(result):
+        # pdf_to_png returns its last page; the others are about the same size
+        return int(os.path.getsize(result) * max(units, 1))
+    return os.path.getsize(result)
+
+
+class ThroughputStats:
+    """
+    Time and output size of past conversions, per "source:target". Time is
+    fitted as fixed + per_unit * units (least squares over the recorded runs),
+    output size as bytes per unit. save() merges this session's runs into
+    the file, so concurrent cli.py runs do not lose each other's history.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_stats_path()
+        self._history = self._load()
+        self._session: Dict[str, List[float]] = {}
+
+    def _load(self) -> Dict[str, List[float]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def add_run(self, info: InputInfo, target_ext: str, seconds: float, out_bytes: int) -> None:
+        """Records one finished conversion (n, sum x, sum y, sum x^2, sum xy, sum output bytes)."""
+        x = float(info.units)
+        sums = self._session.setdefault(f"{info.source_ext}:{target_ext}", [0.0] * 6)
+        for i, value in enumerate((1, x, seconds, x * x, x * seconds, out_bytes)):
+            sums[i] += value
+
+    def _sums(self, key: str) -> List[float]:
+        history = self._history.get(key, [0.0] * 6)
+        session = self._session.get(key, [0.0] * 6)
+        return [a + b for a, b in zip(history, session)]
+
+    def predict(self, info: InputInfo, target_ext: str) -> Tuple[float, int, int]:
+        """(seconds, output bytes, runs learned from) for one conversion."""
+        key = f"{info.source_ext}:{target_ext}"
+        n, sx, sy, sxx, sxy, sout = self._sums(key)
+        if n == 0:
+            return self._default(info, target_ext) + (0,)
+
+        spread = n * sxx - sx * sx
+        if n >= 3 and spread > 1e-9:
+            per_unit = max(0.0, (n * sxy - sx * sy) / spread)
+            fixed = max(0.0, (sy - per_unit * sx) / n)
+        else:
+            # All runs had (nearly) the same size: time scales with it from the origin
+            fixed, per_unit = (0.0, sy / sx) if sx else (sy / n, 0.0)
+        out = sout / sx * info.units if sx else sout / n
+        return fixed + per_unit * info.units, int(out), int(n)
+
+    @staticmethod
+    def _default(info: InputInfo, target_ext: str) -> Tuple[float, int]:
+        if "," in target_ext:
+            # Several targets: sum of their parts (pdf_to_many shares the pass, so this is high)
+            parts = [ThroughputStats._default(info, t) for t in target_ext.split(",")]
+            return sum(p[0] for p in parts), sum(p[1] for p in parts)
+        fixed, per_unit, out_per_unit = DEFAULT_RATES.get(f"{info.source_ext}:{target_ext}", DEFAULT_RATE)
+        out = THUMBNAIL_BYTES if target_ext == "thumbnail" else out_per_unit * info.units
+        return fixed + per_unit * info.units, int(out)
+
+    def save(self) -> None:
+        """Adds this session's runs to the file on disk (written atomically)."""
+        if not self._session:
+            return
+        merged = self._load()
+        for key, session in self._session.items():
+            sums = [a + b for a, b in zip(merged.get(key, [0.0] * 6), session)]
+            if sums[0] > HISTORY_CAP:
+                # Halve the history so the fit follows newer hardware and versions
+                sums = [s / 2 for s in sums]
+            merged[key] = sums
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(merged, f)
+        os.replace(tmp_path, self.path)
+        self._history, self._session = merged, {}
+
+
+def estimate_jobs(jobs: Iterable[Tuple[str, str]], stats: ThroughputStats, raster=None) -> List[JobEstimate]:
+    """Estimates every (input path, target) pair of a batch."""
+    estimates = []
+    for input_path, target_ext in jobs:
+        try:
+            info = describe_input(input_path)
+        except Exception as e:
+            logger.warning(f"Cannot read {input_path}: {e}")
+            size = os.path.getsize(input_path)
+            info = InputInfo(os.path.splitext(input_path)[1].lower().lstrip('.'), size, size / MIB, "MiB", 0)
+        try:
+            memory = estimate_job_memory(input_path, target_ext, raster)
+        except Exception as e:
+            logger.warning(f"Cannot estimate memory for {input_path}: {e}")
+            memory = JOB_BASE_BYTES
+        seconds, out, runs = stats.predict(info, target_ext)
+        estimates.append(JobEstimate(input_path, target_ext, info, seconds, memory, out, runs))
+    return estimates
+
+
+def plan_batch(estimates: List[JobEstimate], limit: int, memory_budget: Optional[int] = None,
+               cores: Optional[int] = None) -> Tuple[float, int]:
+    """
+    (wall seconds, peak memory) of running the batch as convert_jobs_async
+    does: in order, at most `limit` at once, and with a budget only while the
+    running estimates fit (a job larger than the budget runs alone).
+    Job times are per core (see async_converter._ShareClock), so while more
+    jobs run than there are `cores` (default: os.cpu_count()), each advances
+    at cores / running.
+    """
+    cores = cores or os.cpu_count() or 1
+    now = 0.0
+    in_use = peak = 0
+    running: List[List[float]] = []  # [seconds of work left, memory]
+
+    def finish_next() -> None:
+        nonlocal now, in_use
+        speed = min(1.0, cores / len(running))
+        step = min(left for left, _ in running)
+        now += step / speed
+        for job in running:
+            job[0] -= step
+        for job in [job for job in running if job[0] <= 1e-9]:
+            running.remove(job)
+            in_use -= int(job[1])
+
+    for job in estimates:
+        while running and (len(running) >= limit or
+                           (memory_budget and in_use + job.memory > memory_budget)):
+            finish_next()
+        running.append([job.seconds, job.memory])
+        in_use += job.memory
+        peak = max(peak, in_use)
+    while running:
+        finish_next()
+    return now, peak
+
+
+def _size(value: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def _duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}h{minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m{seconds:02d}s"
+
+
+def format_plan(estimates: List[JobEstimate], limit: int, memory_budget: Optional[int] = None,
+                cores: Optional[int] = None) -> str:
+    """The table --estimate prints: one line per file, then the batch totals."""
+    lines = [f"{'file':<32} {'to':<10} {'work':>14} {'images':>6} {'time':>8} {'memory':>10} {'output':>10}  basis"]
+    for job in estimates:
+        name = os.path.basename(job.input_path)
+        name = name if len(name) <= 32 else name[:29] + "..."
+        amount = job.info.units
+        units = f"{amount:.0f} {job.info.unit}" if amount >= 10 or amount == int(amount) else f"{amount:.1f} {job.info.unit}"
+        basis = f"{job.runs} past run(s)" if job.runs else "built-in rates"
+        lines.append(f"{name:<32} {job.target_ext:<10} {units:>14} {job.info.images:>6} {_duration(job.seconds):>8} "
+                     f"{_size(job.memory):>10} {_size(job.output_bytes):>10}  {basis}")
+    cores = cores or os.cpu_count() or 1
+    wall, peak = plan_batch(estimates, limit, memory_budget, cores)
+    lines.append("")
+    lines.append(f"{len(estimates)} file(s) with {limit} job(s) on {cores} core(s): about {_duration(wall)} "
+                 f"(serial {_duration(sum(j.seconds for j in estimates))}), peak memory {_size(peak)}, "
+                 f"output {_size(sum(j.output_bytes for j in estimates))}")
+    return "\n".join(lines)
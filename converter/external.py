@@ -0,0 +1,302 @@
+"""Runs the external tools (LibreOffice, PowerShell, pandoc) that back some conversions."""
+
+import os
+import signal
+import asyncio
+import logging
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncContextManager, Callable, ContextManager, Iterable, List, NamedTuple, Optional, Set
+
+from converter import tracing
+
+logger = logging.getLogger(__name__)
+
+# PyMuPDF is not thread-safe, so fitz work done on the event loop's behalf
+# (finalize callbacks that rasterize or optimize, batch estimates) shares one thread
+_fitz_thread: Optional[ThreadPoolExecutor] = None
+_fitz_thread_lock = threading.Lock()
+_fitz_local = threading.local()
+
+
+def _mark_fitz_thread() -> None:
+    _fitz_local.active = True
+
+
+def fitz_thread() -> ThreadPoolExecutor:
+    """The single thread that async code runs fitz work on."""
+    global _fitz_thread
+    with _fitz_thread_lock:
+        if _fitz_thread is None:
+            _fitz_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fitz",
+                                              initializer=_mark_fitz_thread)
+        return _fitz_thread
+
+
+def on_fitz_thread(fn: Callable, *args, **kwargs):
+    """
+    Runs fn on fitz_thread() and waits for its result. Finalizers call their
+    fitz steps through this, so the rest of their work (publishing, pandoc)
+    does not hold up other jobs' fitz work.
+    """
+    if getattr(_fitz_local, "active", False):
+        return fn(*args, **kwargs)
+    return fitz_thread().submit(fn, *args, **kwargs).result()
+
+
+class ExternalTimeout(Exception):
+    """Raised when an external tool overruns its timeout and has been killed."""
+
+
+class ExternalJob(NamedTuple):
+    """
+    A conversion carried out by an external program.
+    The same job can be run blocking (run_external_job) or on an event loop
+    (run_external_job_async), so both APIs share one definition per converter.
+    """
+    label: str                   # Prefix for log/error messages, e.g. "PowerShell"
+    cmd: List[str]
+    finalize: Callable[[], str]  # Runs after a clean exit, returns the output path
+    hide_window: bool = False    # Hide the console window (PowerShell on Windows)
+    timeout: Optional[float] = None  # Seconds before the whole process tree is killed
+    # Called after a kill to clean up helper processes the tool left behind
+    on_kill: Optional[Callable[[], None]] = None
+    # After a timeout, the job is retried once with the command this yields
+    # (e.g. with a throwaway profile); leaving the context cleans up after it.
+    retry: Optional[Callable[[], ContextManager[List[str]]]] = None
+    # Hold a resource (e.g. an office profile slot) around the first attempt and
+    # yield the command to run with it. prepare_async is used on the event loop.
+    prepare: Optional[Callable[[], ContextManager[List[str]]]] = None
+    prepare_async: Optional[Callable[[], AsyncContextManager[List[str]]]] = None
+    # Always called once the job is over (e.g. to delete its scratch directory)
+    cleanup: Optional[Callable[[], None]] = None
+
+
+def _popen_kwargs(job: ExternalJob) -> dict:
+    """Starts the tool in its own process group so a timeout can kill all of it."""
+    if platform.system() != "Windows":
+        return {"start_new_session": True}
+
+    kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    if job.hide_window:
+        # Hide the PowerShell window
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        kwargs["startupinfo"] = startupinfo
+    return kwargs
+
+
+def kill_process_tree(pid: int) -> None:
+    """Kills a process started by this module together with everything it spawned."""
+    try:
+        if platform.system() == "Windows":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            # start_new_session=True made the child the leader of its own group
+            os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _linux_orphans(image: str, markers: List[str]) -> List[int]:
+    """PIDs of our processes named `image` whose argv has all markers and whose parent died."""
+    found = []
+    uid = os.getuid()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            if os.stat(f"/proc/{entry}").st_uid != uid:
+                continue
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                argv = [a.decode(errors="replace") for a in f.read().split(b"\0") if a]
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # Field 4 is the parent pid; comm (field 2) may contain spaces, so split after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if not argv or image not in os.path.basename(argv[0]):
+            continue
+        if not all(any(m in a for a in argv) for m in markers):
+            continue
+        # Orphans are re-parented to init or to a subreaper such as `systemd --user`
+        try:
+            with open(f"/proc/{ppid}/comm", "r") as f:
+                parent = f.read().strip()
+        except OSError:
+            parent = ""
+        if ppid == 1 or parent in ("systemd", "init"):
+            found.append(int(entry))
+    return found
+
+
+def com_server_pids(image: str, markers: List[str]) -> Set[int]:
+    """PIDs of running `image` processes whose command line contains all `markers` (Windows)."""
+    where = " -and ".join(f"$_.CommandLine -like '*{m}*'" for m in markers) or "$true"
+    ps = (f"Get-CimInstance Win32_Process -Filter \"Name='{image}'\" | "
+          f"Where-Object {{ {where} }} | ForEach-Object {{ $_.ProcessId }}")
+    result = subprocess.run(["powershell", "-NoProfile", "-Command", ps],
+                            capture_output=True, text=True)
+    return {int(pid) for pid in result.stdout.split() if pid.isdigit()}
+
+
+def reap_orphans(image: str, markers: List[str], spare: Iterable[int] = ()) -> int:
+    """
+    Kills leftover helper processes from earlier conversions (e.g. a headless
+    soffice whose parent was killed) so they stop holding profile locks.
+    On Windows, `markers` are matched against the command line of COM servers.
+    DCOM starts those under a long-lived svchost, so an orphan cannot be told
+    by its parent there: every match except the `spare` PIDs (the servers that
+    were already running when the caller's job started) is killed.
+    Returns the number of processes signalled.
+    """
+    if platform.system() == "Windows":
+        pids = com_server_pids(image, markers) - set(spare)
+        for pid in pids:
+            kill_process_tree(pid)
+        count = len(pids)
+    elif os.path.isdir("/proc"):
+        count = 0
+        for pid in _linux_orphans(image, markers):
+            try:
+                pgid = os.getpgid(pid)
+                if pgid != os.getpgid(0):
+                    os.killpg(pgid, signal.SIGKILL)
+                else:
+                    os.kill(pid, signal.SIGKILL)
+                count += 1
+            except (ProcessLookupError, PermissionError):
+                pass
+    else:
+        return 0
+
+    if count:
+        logger.warning(f"Reaped {count} orphaned {image} process(es)")
+    return count
+
+
+def _check_exit(job: ExternalJob, returncode: int, stderr: str) -> None:
+    if returncode != 0:
+        logger.error(f"{job.label} Error: {stderr}")
+        raise Exception(f"{job.label} failed: {stderr}")
+
+
+def _after_kill(job: ExternalJob) -> None:
+    if job.on_kill:
+        try:
+            job.on_kill()
+        except Exception as e:
+            logger.warning(f"{job.label}: cleanup after kill failed: {e}")
+
+
+def _trace_subprocess(job: ExternalJob, cmd: List[str], pid: int, start_us: int, returncode) -> None:
+    """One trace track per subprocess, since several run side by side."""
+    tracing.name_track(pid, f"{os.path.basename(cmd[0])} {pid}")
+    tracing.record(job.label, "subprocess", start_us, tracing.now_us(), tid=pid,
+                   cmd=os.path.basename(cmd[0]), returncode=returncode)
+
+
+def _run(job: ExternalJob, cmd: List[str]) -> None:
+    start = tracing.now_us()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, **_popen_kwargs(job))
+    try:
+        _, stderr = proc.communicate(timeout=job.timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_tree(proc.pid)
+        proc.kill()
+        proc.communicate()
+        _trace_subprocess(job, cmd, proc.pid, start, "killed")
+        _after_kill(job)
+        raise ExternalTimeout(f"{job.label} timed out after {job.timeout}s")
+    _trace_subprocess(job, cmd, proc.pid, start, proc.returncode)
+    _check_exit(job, proc.returncode, stderr)
+
+
+async def _run_async(job: ExternalJob, cmd: List[str]) -> None:
+    start = tracing.now_us()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        **_popen_kwargs(job),
+    )
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), job.timeout)
+    except asyncio.TimeoutError:
+        kill_process_tree(proc.pid)
+        await proc.wait()
+        _trace_subprocess(job, cmd, proc.pid, start, "killed")
+        _after_kill(job)
+        raise ExternalTimeout(f"{job.label} timed out after {job.timeout}s")
+    _trace_subprocess(job, cmd, proc.pid, start, proc.returncode)
+    _check_exit(job, proc.returncode, stderr.decode(errors="replace"))
+
+
+def _first_attempt(job: ExternalJob) -> None:
+    if job.prepare is None:
+        _run(job, job.cmd)
+        return
+    with job.prepare() as cmd:
+        _run(job, cmd)
+
+
+async def _first_attempt_async(job: ExternalJob) -> None:
+    if job.prepare_async is None:
+        await _run_async(job, job.cmd)
+        return
+    async with job.prepare_async() as cmd:
+        await _run_async(job, cmd)
+
+
+def _cleanup(job: ExternalJob) -> None:
+    if job.cleanup:
+        job.cleanup()
+
+
+def _traced_finalize(job: ExternalJob) -> str:
+    with tracing.span("finalize", label=job.label):
+        return job.finalize()
+
+
+def run_external_job(job: ExternalJob) -> str:
+    """Runs the job's command, blocking until it exits (or times out and is retried once)."""
+    try:
+        try:
+            _first_attempt(job)
+        except ExternalTimeout as e:
+            if job.retry is None:
+                logger.error(str(e))
+                raise
+            logger.warning(f"{e}; retrying once")
+            with job.retry() as cmd:
+                _run(job, cmd)
+        return _traced_finalize(job)
+    finally:
+        _cleanup(job)
+
+
+async def run_external_job_async(job: ExternalJob) -> str:
+    """
+    Runs the job's command without blocking the event loop. finalize() runs
+    on the default executor; its fitz steps go through on_fitz_thread().
+    """
+    try:
+        try:
+            await _first_attempt_async(job)
+        except ExternalTimeout as e:
+            if job.retry is None:
+                logger.error(str(e))
+                raise
+            logger.warning(f"{e}; retrying once")
+            with job.retry() as cmd:
+                await _run_async(job, cmd)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _traced_finalize, job)
+    finally:
+        _cleanup(job)
@@ -0,0 +1,138 @@
+"""
+PDF -> HTML with images as separate files.
+
+fitz's HTML output inlines every image as base64 (a third larger than the
+image, and slow for browsers to parse). Here the text is taken from fitz
+without images, and each distinct image is written once into a sidecar
+folder and referenced by URL. Pages are written one at a time.
+"""
+
+import os
+import html
+import hashlib
+import logging
+from urllib.parse import quote
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+HTML_HEAD = '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n</head>\n<body>\n'
+HTML_TAIL = "</body>\n</html>\n"
+# pdf_to_html's html_images: base64 data URIs (fitz's own output) or files in a sidecar folder
+HTML_IMAGE_MODES = ("inline", "external")
+# Formats browsers display; anything else (JPX, JBIG2, CMYK, ...) is converted to PNG
+WEB_IMAGE_FORMATS = ("png", "jpeg", "jpg", "gif", "webp")
+
+
+class ImageStore:
+    """Writes each distinct image of a document once into `files_dir` and names it."""
+
+    def __init__(self, doc, files_dir: str):
+        self.doc = doc
+        self.files_dir = files_dir
+        self._by_xref: Dict[int, str] = {}
+        self._by_hash: Dict[str, str] = {}
+
+    @property
+    def count(self) -> int:
+        return len(self._by_hash)
+
+    def write(self, data: bytes, ext: str) -> str:
+        """Stores image bytes unless identical ones were stored before; returns the file name."""
+        digest = hashlib.blake2b(data, digest_size=12).hexdigest()
+        name = self._by_hash.get(digest)
+        if name is None:
+            name = f"img_{digest}.{ext}"
+            with open(os.path.join(self.files_dir, name), "wb") as f:
+                f.write(data)
+            self._by_hash[digest] = name
+        return name
+
+    def _extract(self, xref: int) -> Tuple[bytes, str]:
+        """The image's own encoded stream where browsers can show it, else a PNG."""
+        import fitz
+        image = self.doc.extract_image(xref)
+        if image["ext"] in WEB_IMAGE_FORMATS and not image.get("smask"):
+            return image["image"], image["ext"]
+
+        pix = fitz.Pixmap(self.doc, xref)
+        if pix.colorspace and pix.colorspace.n > 3:
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        if image.get("smask"):
+            pix = fitz.Pixmap(pix, fitz.Pixmap(self.doc, image["smask"]))
+        return pix.tobytes("png"), "png"
+
+    def name_for(self, page, info: dict) -> str:
+        """File name for one entry of page.get_image_info(xrefs=True)."""
+        import fitz
+        xref = info.get("xref", 0)
+        if xref in self._by_xref:
+            return self._by_xref[xref]
+        if xref:
+            name = self.write(*self._extract(xref))
+            self._by_xref[xref] = name
+            return name
+
+        # Inline image (no xref to extract): render its area at roughly its own resolution
+        bbox = fitz.Rect(info["bbox"])
+        zoom = min(4.0, max(1.0, info.get("width", 0) / max(bbox.width, 1)))
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=bbox)
+        return self.write(pix.tobytes("png"), "png")
+
+
+def page_html(page, images: ImageStore, url_prefix: str) -> str:
+    """fitz's HTML for one page, with <img> tags pointing at files instead of data URIs."""
+    import fitz
+    text_html = page.get_text("html", flags=fitz.TEXTFLAGS_HTML & ~fitz.TEXT_PRESERVE_IMAGES)
+    tags = []
+    for info in page.get_image_info(xrefs=True):
+        x0, y0, x1, y1 = info["bbox"]
+        if x1 <= x0 or y1 <= y0:
+            continue
+        src = quote(url_prefix + images.name_for(page, info))
+        tags.append(f'<img style="position:absolute;left:{x0:.1f}pt;top:{y0:.1f}pt;'
+                    f'width:{x1 - x0:.1f}pt;height:{y1 - y0:.1f}pt" src="{src}">\n')
+
+    # Images go first inside the page <div>, so the text is drawn over them
+    head_end = text_html.index(">") + 1
+    return text_html[:head_end] + "\n" + "".join(tags) + text_html[head_end:]
+
+
+def _page_nav(page_number: int, page_count: int, index_url: str) -> str:
+    links = []
+    if page_number > 1:
+        links.append(f'<a href="page_{page_number - 1}.html">Previous</a>')
+    links.append(f'<a href="{index_url}">Index</a>')
+    if page_number < page_count:
+        links.append(f'<a href="page_{page_number + 1}.html">Next</a>')
+    return f"<nav>{' | '.join(links)}</nav>\n"
+
+
+def export_pdf_html(doc, html_path: str, files_dir: str, split: bool = False, title: str = "") -> None:
+    """
+    Writes an open fitz document to html_path with its images in files_dir
+    (an existing folder next to html_path). With `split`, every page becomes
+    files_dir/page_N.html and html_path is an index linking to them.
+    """
+    images = ImageStore(doc, files_dir)
+    files_url = os.path.basename(files_dir) + "/"
+    index_url = quote("../" + os.path.basename(html_path))
+    with open(html_path, "w", encoding="utf-8") as index:
+        index.write(HTML_HEAD.format(title=html.escape(title)))
+        if split:
+            index.write("<ol>\n")
+        for page_number, page in enumerate(doc, start=1):
+            if not split:
+                index.write(page_html(page, images, files_url) + "\n")
+                continue
+            page_name = f"page_{page_number}.html"
+            with open(os.path.join(files_dir, page_name), "w", encoding="utf-8") as f:
+                f.write(HTML_HEAD.format(title=html.escape(f"{title} - page {page_number}")))
+                f.write(_page_nav(page_number, doc.page_count, index_url))
+                f.write(page_html(page, images, ""))
+                f.write(HTML_TAIL)
+            index.write(f'<li><a href="{quote(files_url + page_name)}">Page {page_number}</a></li>\n')
+        if split:
+            index.write("</ol>\n")
+        index.write(HTML_TAIL)
+    logger.info(f"Wrote {doc.page_count} page(s) and {images.count} image file(s) to {files_dir}")
@@ -0,0 +1,111 @@
+"""Pool of LibreOffice user profiles so several headless instances can run side by side."""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager, asynccontextmanager
+from typing import IO, AsyncIterator, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: slots guard Office COM jobs there (see document_converter.COM_SLOT)
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def _try_lock(lock_file: IO) -> bool:
+    """Takes an exclusive lock on an open file without waiting; False if someone holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(lock_file: IO) -> None:
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def default_profile_root() -> str:
+    """~/.cache/liteswitch/office_profiles (honours XDG_CACHE_HOME)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "liteswitch", "office_profiles")
+
+
+class OfficeProfilePool:
+    """
+    A fixed set of persistent profile directories (worker_0 .. worker_N-1).
+    Two soffice processes on one profile collide on its lock, so every running
+    conversion holds one slot. Slots are guarded by locked files (flock, or
+    msvcrt.locking on Windows), which makes the pool safe across threads,
+    worker processes and separate cli.py runs.
+    Profiles are created by LibreOffice on first use and reused afterwards.
+    """
+
+    def __init__(self, root: str, size: int):
+        self.root = root
+        self.size = max(1, size)
+
+    def profile_dir(self, index: int) -> str:
+        return os.path.join(self.root, f"worker_{index}")
+
+    def try_acquire(self) -> Optional[Tuple[str, Optional[IO]]]:
+        """Returns (profile_dir, lock_handle) for a free slot, or None if all are busy."""
+        os.makedirs(self.root, exist_ok=True)
+        for i in range(self.size):
+            lock_file = open(os.path.join(self.root, f"worker_{i}.lock"), "a")
+            if not _try_lock(lock_file):
+                lock_file.close()
+                continue
+
+            profile = self.profile_dir(i)
+            # We hold the slot, so any LibreOffice lock inside is left over from a killed run
+            stale_lock = os.path.join(profile, ".lock")
+            if os.path.exists(stale_lock):
+                logger.info(f"Removing stale office profile lock: {stale_lock}")
+                os.remove(stale_lock)
+            return profile, lock_file
+        return None
+
+    @staticmethod
+    def release(lock_file: Optional[IO]) -> None:
+        if lock_file is not None:
+            _unlock(lock_file)
+            lock_file.close()
+
+    @contextmanager
+    def slot(self, poll: float = 0.1) -> Iterator[str]:
+        """Blocks until a profile is free and holds it for the duration of the block."""
+        acquired = self.try_acquire()
+        while acquired is None:
+            time.sleep(poll)
+            acquired = self.try_acquire()
+        profile, lock_file = acquired
+        try:
+            yield profile
+        finally:
+            self.release(lock_file)
+
+    @asynccontextmanager
+    async def slot_async(self, poll: float = 0.1) -> AsyncIterator[str]:
+        """Like slot(), but waits on the event loop instead of blocking it."""
+        acquired = self.try_acquire()
+        while acquired is None:
+            await asyncio.sleep(poll)
+            acquired = self.try_acquire()
+        profile, lock_file = acquired
+        try:
+            yield profile
+        finally:
+            self.release(lock_file)
@@ -0,0 +1,63 @@
+"""
+On-disk cache of pandoc's JSON AST for DOCX inputs.
+
+Parsing the DOCX is most of the cost of a pandoc conversion. The reader runs
+once per document (keyed by a hash of its bytes and the pandoc version) and
+every DOCX -> text format conversion renders from the cached AST, including
+later runs that ask for a different format.
+"""
+
+import os
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Least recently used entries beyond this many are deleted
+AST_CACHE_MAX = 64
+HASH_CHUNK = 1024 * 1024
+
+
+def default_cache_root() -> str:
+    """~/.cache/liteswitch/pandoc_ast (honours XDG_CACHE_HOME)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "liteswitch", "pandoc_ast")
+
+
+def input_digest(input_path: str, salt: str = "") -> str:
+    """SHA-256 of the file's bytes (plus `salt`, e.g. the pandoc version)."""
+    digest = hashlib.sha256(salt.encode())
+    with open(input_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ast_path(input_path: str, pandoc_version: str, root: str = None) -> str:
+    """Where the AST of input_path lives in the cache (it may not exist yet)."""
+    root = root or default_cache_root()
+    return os.path.join(root, f"{input_digest(input_path, pandoc_version)}.json")
+
+
+def lookup(path: str) -> bool:
+    """True if the AST is cached. A hit is marked as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        return False
+    logger.info(f"Using cached pandoc AST: {path}")
+    return True
+
+
+def prune(root: str, keep: int = AST_CACHE_MAX) -> None:
+    """Deletes the least recently used ASTs beyond `keep`."""
+    try:
+        entries = [os.path.join(root, e) for e in os.listdir(root) if e.endswith(".json")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        return
+    for stale in entries[keep:]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass  # Already gone, or removed by a concurrent run
@@ -0,0 +1,66 @@
+"""
+Optional size optimization for the PDFs LiteSwitch writes.
+
+Pillow and the office suites save PDFs without object garbage collection,
+stream compression or image downsampling. optimize_pdf() rewrites such a
+file with PyMuPDF before it is published.
+"""
+
+import os
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PdfOptimizeOptions:
+    """How optimize_pdf() rewrites a file (see PDF_OPTIMIZE_PRESETS)."""
+    garbage: int = 4                           # fitz garbage level: 4 also merges duplicate streams
+    clean: bool = True                         # Sanitize content streams
+    image_dpi_threshold: Optional[int] = None  # Downsample images shown above this resolution...
+    image_dpi: Optional[int] = None            # ...to this one
+    image_quality: int = 0                     # JPEG quality of rewritten images (0: fitz default)
+
+
+PDF_OPTIMIZE_PRESETS = {
+    # Structure only: unused objects dropped, duplicates merged, everything deflated
+    "lossless": PdfOptimizeOptions(),
+    "screen": PdfOptimizeOptions(image_dpi_threshold=150, image_dpi=96, image_quality=60),
+    "print": PdfOptimizeOptions(image_dpi_threshold=450, image_dpi=300, image_quality=90),
+}
+
+
+def _rewrite_images(doc, options: PdfOptimizeOptions) -> None:
+    if not hasattr(doc, "rewrite_images"):
+        logger.warning("This PyMuPDF cannot rewrite images (needs 1.25.4+); images are left as they are")
+        return
+    doc.rewrite_images(dpi_threshold=options.image_dpi_threshold, dpi_target=options.image_dpi,
+                       quality=options.image_quality)
+
+
+def optimize_pdf(path: str, preset: str) -> str:
+    """
+    Optimizes the PDF at `path` in place (callers pass a scratch copy) and
+    returns `path`. The original is kept if the rewrite does not make it smaller.
+    """
+    import fitz
+    options = PDF_OPTIMIZE_PRESETS[preset]
+    optimized = f"{path}.optimized"
+    before = os.path.getsize(path)
+
+    with fitz.open(path) as doc:
+        if options.image_dpi:
+            _rewrite_images(doc, options)
+        doc.save(optimized, garbage=options.garbage, clean=options.clean, deflate=True,
+                 deflate_images=True, deflate_fonts=True, use_objstms=1)
+
+    after = os.path.getsize(optimized)
+    if after < before:
+        os.replace(optimized, path)
+        logger.info(f"Optimized PDF ({preset}): {before} -> {after} bytes")
+    else:
+        os.remove(optimized)
+        logger.info(f"PDF already compact ({preset}), kept as is")
+    return path
@@ -0,0 +1,402 @@
+"""Rasterization helpers shared by the PDF/PPTX -> image converters (PyMuPDF)."""
+
+import io
+import os
+import math
+import hashlib
+import logging
+import itertools
+import collections
+from dataclasses import dataclass, fields
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from converter import tracing
+
+logger = logging.getLogger(__name__)
+
+# Matches the size PowerPoint's Slide.Export is asked for on Windows
+SLIDE_PNG_SIZE: Tuple[int, int] = (1920, 1080)
+
+# Below this many pages the process start-up costs more than it saves
+PARALLEL_MIN_PAGES = 4
+# Pages per task when encoded pages are streamed back to the caller
+ENCODE_CHUNK_PAGES = 8
+
+RASTER_FORMATS = ("png", "jpeg", "webp")
+
+# What happens to blank pages: rendered like any other, left out, or one kept per run of blanks
+BLANK_PAGE_MODES = ("keep", "skip", "collapse")
+BLANK_PROBE_DPI = 24       # Resolution of the grayscale preview a blank page is judged on
+BLANK_MAX_STDDEV = 2.0     # Previews this uniform (gray levels) are blank outright
+BLANK_INK_DELTA = 48       # A preview pixel this far from the background counts as ink...
+BLANK_MAX_INK = 0.001      # ...and a page with at most this share of ink pixels is blank
+
+
+@dataclass(frozen=True)
+class RasterOptions:
+    """
+    How pages are rendered and encoded. Fields left as None are filled from
+    the converter's own defaults (see resolve()), so callers only set what
+    they want to change.
+    """
+    dpi: Optional[float] = None                # Render resolution
+    box: Optional[Tuple[int, int]] = None      # Or: fit each page inside (width, height) pixels
+    max_pixels: Optional[int] = None           # Cap on width * height per page
+    fmt: Optional[str] = None                  # "png", "jpeg" or "webp"
+    quality: Optional[int] = None              # JPEG/WebP quality (1-100)
+    compression: Optional[int] = None          # PNG zlib level 0-9 (None: fitz's own encoder)
+    grayscale: Optional[bool] = None
+    alpha: Optional[bool] = None               # Keep transparency (PNG/WebP only)
+
+    def __post_init__(self):
+        # Caught here rather than by Pillow/fitz halfway through a batch
+        if self.dpi is not None and self.dpi <= 0:
+            raise ValueError(f"DPI must be positive, not {self.dpi}")
+        if self.max_pixels is not None and self.max_pixels <= 0:
+            raise ValueError(f"max_pixels must be positive, not {self.max_pixels}")
+        if self.quality is not None and not 1 <= self.quality <= 100:
+            raise ValueError(f"Quality must be between 1 and 100, not {self.quality}")
+        if self.compression is not None and not 0 <= self.compression <= 9:
+            raise ValueError(f"Compression must be between 0 and 9, not {self.compression}")
+        if self.fmt is not None and self.fmt not in RASTER_FORMATS:
+            raise ValueError(f"Unknown image format: {self.fmt}")
+
+    def merged(self, defaults: "RasterOptions") -> "RasterOptions":
+        """Fills unset fields from `defaults`. dpi and box are one setting: if either is set, neither is inherited."""
+        values = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            values[f.name] = value if value is not None else getattr(defaults, f.name)
+        if self.dpi is not None or self.box is not None:
+            values["dpi"], values["box"] = self.dpi, self.box
+        return RasterOptions(**values)
+
+    def resolve(self, defaults: "RasterOptions") -> "RasterOptions":
+        """Applies the converter's defaults, then the library-wide ones."""
+        return self.merged(defaults).merged(BASE_OPTIONS)
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.fmt == "jpeg" else (self.fmt or "png")
+
+    def zoom(self, page_width: float, page_height: float) -> float:
+        """Render zoom for a page of the given size in points."""
+        if self.box:
+            zoom = fit_zoom(page_width, page_height, self.box)
+        else:
+            zoom = (self.dpi or 72) / 72
+        if self.max_pixels:
+            zoom = min(zoom, math.sqrt(self.max_pixels / (page_width * page_height)))
+        return zoom
+
+    def render(self, page, clip=None):
+        """Renders a fitz page to a Pixmap according to these options."""
+        import fitz
+        zoom = self.zoom(page.rect.width, page.rect.height)
+        colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+        alpha = bool(self.alpha) and self.fmt != "jpeg"
+        with tracing.span("render", page=page.number):
+            return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace,
+                                   alpha=alpha, clip=clip)
+
+    def _pillow_image(self, pix):
+        from PIL import Image
+        mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[pix.n]
+        return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+    def _pillow_save(self, pix, target) -> None:
+        img = self._pillow_image(pix)
+        if self.fmt == "jpeg":
+            img.save(target, "JPEG", quality=self.quality)
+        elif self.fmt == "webp":
+            img.save(target, "WEBP", quality=self.quality, method=4)
+        else:
+            img.save(target, "PNG", compress_level=self.compression)
+
+    def save(self, pix, path: str) -> None:
+        """Writes a Pixmap to disk in the configured format."""
+        with tracing.span("encode", fmt=self.fmt):
+            if self.fmt == "png" and self.compression is None:
+                pix.save(path)  # fitz's encoder, no Pillow round trip
+            else:
+                self._pillow_save(pix, path)
+
+    def encode(self, pix) -> bytes:
+        """Returns the Pixmap encoded in the configured format."""
+        with tracing.span("encode", fmt=self.fmt):
+            if self.fmt == "png" and self.compression is None:
+                return pix.tobytes("png")
+            buffer = io.BytesIO()
+            self._pillow_save(pix, buffer)
+            return buffer.getvalue()
+
+
+BASE_OPTIONS = RasterOptions(dpi=72, fmt="png", quality=90, grayscale=False, alpha=False)
+
+# Per-converter defaults (what they rendered before options existed)
+PDF_PNG_OPTIONS = RasterOptions(dpi=216)             # fitz.Matrix(3, 3)
+PDF_PPTX_OPTIONS = RasterOptions(dpi=144)            # fitz.Matrix(2, 2)
+SLIDE_PNG_OPTIONS = RasterOptions(box=SLIDE_PNG_SIZE)
+
+RASTER_PRESETS = {
+    "default": RasterOptions(),
+    # Screen-quality JPEG: a fraction of the encode time and size of 3x PNG
+    "fast": RasterOptions(dpi=110, fmt="jpeg", quality=80),
+    "print": RasterOptions(dpi=300, fmt="png"),
+}
+
+
+def content_fingerprint(page) -> Optional[str]:
+    """
+    Hash of everything that decides how a fitz page renders: its boxes, rotation,
+    resources and content streams. Two pages with the same fingerprint draw the
+    same thing, so the second need not be rendered. None when that cannot be
+    told cheaply (annotations, inherited resources).
+    """
+    if page.first_annot is not None or page.first_widget is not None:
+        return None
+    doc = page.parent
+    kind, resources = doc.xref_get_key(page.xref, "Resources")
+    if kind == "null":
+        return None
+    if kind == "xref":
+        resources = doc.xref_object(int(resources.split()[0]), compressed=True)
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{tuple(page.mediabox)}|{tuple(page.cropbox)}|{page.rotation}|".encode())
+    digest.update(doc.xref_get_key(page.xref, "Group")[1].encode())
+    digest.update(resources.encode())
+    for xref in page.get_contents():
+        digest.update(doc.xref_stream(xref) or b"")
+    return "content:" + digest.hexdigest()
+
+
+def pixel_fingerprint(pix) -> str:
+    """Hash of a rendered Pixmap's size and samples."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{pix.width}x{pix.height}x{pix.n}|".encode())
+    digest.update(pix.samples)
+    return "pixels:" + digest.hexdigest()
+
+
+class PageCache:
+    """
+    Recognizes repeated pages (section dividers, template slides) so each
+    distinct page is rendered and stored once. A page is looked up by its
+    content before rendering, then by its pixels, which also catches pages
+    that draw the same image in different ways. A disabled cache renders
+    every page.
+    """
+
+    def __init__(self, options: "RasterOptions", enabled: bool = True):
+        self.options = options
+        self.enabled = enabled
+        self._seen: Dict[str, Any] = {}
+        self.hits = 0
+
+    def get(self, page, produce: Callable[[Any], Any]) -> Tuple[Any, bool]:
+        """
+        Returns (value, repeated). For a new page, `produce` receives the
+        rendered Pixmap and its return value (e.g. the path it was saved to)
+        is remembered; a repeat returns the value of the first occurrence.
+        """
+        if not self.enabled:
+            return produce(self.options.render(page)), False
+
+        content_key = content_fingerprint(page)
+        if content_key in self._seen:
+            self.hits += 1
+            return self._seen[content_key], True
+
+        pix = self.options.render(page)
+        pixel_key = pixel_fingerprint(pix)
+        repeated = pixel_key in self._seen
+        if repeated:
+            self.hits += 1
+        else:
+            self._seen[pixel_key] = produce(pix)
+        if content_key:
+            self._seen[content_key] = self._seen[pixel_key]
+        return self._seen[pixel_key], repeated
+
+
+def _has_content(page) -> bool:
+    doc = page.parent
+    if page.first_annot is not None or page.first_widget is not None:
+        return True
+    return any((doc.xref_stream(xref) or b"").strip() for xref in page.get_contents())
+
+
+def is_blank_samples(samples, background_delta: int = BLANK_INK_DELTA) -> bool:
+    """Vectorized test on a 2-D uint8 array of gray levels: uniform, or nearly all background."""
+    import numpy as np
+    if samples.size == 0 or samples.std() <= BLANK_MAX_STDDEV:
+        return True
+    # Judged against the page's own background, so gray or yellowed scans count as blank too
+    background = np.median(samples)
+    ink = np.count_nonzero(np.abs(samples.astype(np.int16) - background) > background_delta)
+    return ink <= BLANK_MAX_INK * samples.size
+
+
+def is_blank_page(page) -> bool:
+    """
+    Whether a fitz page is blank or nearly so (e.g. a scanned separator sheet).
+    Cheap checks come first: no content at all means blank, extractable text
+    means not. Only pages that draw something without text (scans, shapes)
+    are rendered, as a small grayscale preview.
+    """
+    import fitz
+    import numpy as np
+    if not _has_content(page):
+        return True
+    if page.get_text("text").strip():
+        return False
+    zoom = BLANK_PROBE_DPI / 72
+    with tracing.span("blank probe", page=page.number):
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return is_blank_samples(samples)
+
+
+class BlankPageFilter:
+    """
+    Picks the pages to leave out: every blank page with mode="skip", or all
+    but the first of each run of consecutive blank pages with mode="collapse".
+    Pages must be passed in order. mode="keep" keeps every page without
+    looking at it.
+    """
+
+    def __init__(self, mode: str = "keep"):
+        if mode not in BLANK_PAGE_MODES:
+            raise ValueError(f"Unknown blank page mode: {mode}")
+        self.mode = mode
+        self.dropped = 0
+        self._previous_blank = False
+
+    def drop(self, page) -> bool:
+        if self.mode == "keep":
+            return False
+        blank = is_blank_page(page)
+        drop = blank and (self.mode == "skip" or self._previous_blank)
+        self._previous_blank = blank
+        if drop:
+            self.dropped += 1
+        return drop
+
+
+def select_pages(pdf_path: str, mode: str = "keep") -> List[int]:
+    """0-based numbers of the pages of pdf_path that BlankPageFilter(mode) keeps."""
+    import fitz
+    blanks = BlankPageFilter(mode)
+    with fitz.open(pdf_path) as doc:
+        kept = [page.number for page in doc if not blanks.drop(page)]
+    if blanks.dropped:
+        logger.info(f"Leaving out {blanks.dropped} blank page(s) of {pdf_path}")
+    return kept
+
+
+def fit_zoom(page_width: float, page_height: float, box: Tuple[int, int]) -> float:
+    """Zoom factor that makes a page fit inside box=(width, height) pixels, keeping its aspect ratio."""
+    return min(box[0] / page_width, box[1] / page_height)
+
+
+def _render_chunk(pdf_path: str, page_numbers: Sequence[int], out_dir: str,
+                  name_pattern: str, options: RasterOptions) -> List[str]:
+    """Renders the given 0-based pages of one PDF. Runs in a worker process."""
+    import fitz
+    written = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_number in page_numbers:
+            pix = options.render(doc.load_page(page_number))
+            path = os.path.join(out_dir, name_pattern.format(page_number + 1))
+            options.save(pix, path)
+            written.append(path)
+    finally:
+        doc.close()
+    return written
+
+
+def render_pdf_pages(pdf_path: str, out_dir: str, name_pattern: str = "Slide_{}.png",
+                     options: RasterOptions = SLIDE_PNG_OPTIONS, workers: Optional[int] = None,
+                     pages: Optional[Sequence[int]] = None, in_process: bool = True) -> List[str]:
+    """
+    Renders every page of pdf_path (or the 0-based `pages`) into out_dir.
+    Pages are dealt round-robin to up to `workers` processes (default: CPU count),
+    each of which opens the PDF once; fitz itself is not thread-safe.
+    Unset fields of `options` take the SLIDE_PNG defaults.
+    Short documents are rendered in the calling thread, unless in_process=False
+    (callers off the fitz thread, which must also pass `pages`).
+    Returns the written paths in page order.
+    """
+    options = options.resolve(SLIDE_PNG_OPTIONS)
+    if pages is None:
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            pages = range(doc.page_count)
+    page_count = len(pages)
+    if not page_count:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, page_count)
+    if in_process and (workers <= 1 or page_count < PARALLEL_MIN_PAGES):
+        return _render_chunk(pdf_path, pages, out_dir, name_pattern, options)
+
+    chunks = [pages[i::workers] for i in range(workers)]
+    logger.info(f"Rasterizing {page_count} pages of {pdf_path} on {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_chunk, pdf_path, chunk, out_dir, name_pattern, options)
+                   for chunk in chunks]
+        for future in futures:
+            future.result()  # re-raise a worker's failure
+
+    return [os.path.join(out_dir, name_pattern.format(n + 1)) for n in pages]
+
+
+def _encode_chunk(pdf_path: str, page_numbers: Sequence[int], options: RasterOptions) -> List[bytes]:
+    """Renders and encodes the given 0-based pages of one PDF. Runs in a worker process."""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return [options.encode(options.render(doc.load_page(n))) for n in page_numbers]
+
+
+def iter_encoded_pages(pdf_path: str, options: RasterOptions = SLIDE_PNG_OPTIONS,
+                       workers: Optional[int] = None, pages: Optional[Sequence[int]] = None,
+                       in_process: bool = True) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields (1-based page number, encoded image) in page order for every page
+    (or the 0-based `pages`), for callers that write pages somewhere other
+    than loose files (e.g. an archive).
+    Runs of ENCODE_CHUNK_PAGES pages go to up to `workers` processes, with at
+    most two runs per worker in flight, so memory stays bounded for long documents.
+    in_process works as for render_pdf_pages().
+    """
+    import fitz
+    options = options.resolve(SLIDE_PNG_OPTIONS)
+    if pages is None:
+        with fitz.open(pdf_path) as doc:
+            pages = range(doc.page_count)
+    page_count = len(pages)
+    if not page_count:
+        return
+    workers = min(workers or os.cpu_count() or 1, page_count)
+    if in_process and (workers <= 1 or page_count < PARALLEL_MIN_PAGES):
+        with fitz.open(pdf_path) as doc:
+            for page_number in pages:
+                yield page_number + 1, options.encode(options.render(doc.load_page(page_number)))
+        return
+
+    chunks = iter([pages[i:i + ENCODE_CHUNK_PAGES] for i in range(0, page_count, ENCODE_CHUNK_PAGES)])
+    logger.info(f"Rasterizing {page_count} pages of {pdf_path} on {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque((chunk, pool.submit(_encode_chunk, pdf_path, chunk, options))
+                                    for chunk in itertools.islice(chunks, 2 * workers))
+        while pending:
+            chunk, future = pending.popleft()
+            encoded = future.result()
+            following = next(chunks, None)
+            if following is not None:
+                pending.append((following, pool.submit(_encode_chunk, pdf_path, following, options)))
+            for page_number, data in zip(chunk, encoded):
+                yield page_number + 1, data
@@ -0,0 +1,225 @@
+"""
+Resource-limited worker processes for the in-process converters.
+
+fitz, pdfminer and pdf2docx run inside LiteSwitch's own processes, so one
+pathological PDF can eat all memory or loop forever. SandboxExecutor runs
+each job in a worker process with an address-space limit (RLIMIT_AS), a CPU
+time limit (RLIMIT_CPU) and a wall-clock deadline. A worker that crashes or
+overruns fails only its own job and is replaced by a fresh one for the next.
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+from converter.external import kill_process_tree
+
+logger = logging.getLogger(__name__)
+
+GIB = 1024 ** 3
+
+
+class SandboxError(Exception):
+    """Raised for a job whose worker crashed, hit a limit or overran its deadline."""
+
+
+class SandboxTimeout(SandboxError):
+    """Raised when a job overruns its wall-clock deadline and its worker has been killed."""
+
+
+@dataclass(frozen=True)
+class SandboxLimits:
+    """Per-job limits; None leaves one unset. Memory and CPU limits need a POSIX system."""
+    memory: Optional[int] = 4 * GIB        # Bytes of address space of a worker (RLIMIT_AS)
+    cpu_seconds: Optional[int] = 600       # CPU time of one job (RLIMIT_CPU)
+    timeout: Optional[float] = 900         # Wall-clock seconds of one job
+
+
+class JobMetrics(NamedTuple):
+    """Sent back by the worker with every result."""
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss: Optional[int]  # Bytes; the worker's peak so far, as it runs many jobs
+
+
+def _apply_memory_limit(limits: SandboxLimits) -> None:
+    if limits.memory is None or sys.platform == "win32":
+        return
+    import resource
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    # An unprivileged process cannot raise its hard limit
+    soft = limits.memory if hard == resource.RLIM_INFINITY else min(limits.memory, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def _apply_cpu_limit(limits: SandboxLimits) -> None:
+    """RLIMIT_CPU counts the worker's whole life, so each job gets `cpu_seconds` on top of what it used."""
+    if limits.cpu_seconds is None or sys.platform == "win32":
+        return
+    import resource
+    used = int(time.process_time()) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + limits.cpu_seconds
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def _peak_rss() -> Optional[int]:
+    if sys.platform == "win32":
+        return None
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def _worker_main(conn, limits: SandboxLimits) -> None:
+    """Runs jobs from `conn` until told to stop; replies (ok, result or exception, metrics)."""
+    if sys.platform != "win32":
+        # Own process group, so a kill also takes the render workers a job started
+        os.setsid()
+    _apply_memory_limit(limits)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:  # The parent went away
+            return
+        if job is None:
+            return
+        fn, args, kwargs = job
+        _apply_cpu_limit(limits)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            ok, value = True, fn(*args, **kwargs)
+        except BaseException as e:
+            ok, value = False, e
+        metrics = JobMetrics(time.perf_counter() - start, time.process_time() - cpu_start, _peak_rss())
+        try:
+            conn.send((ok, value, metrics))
+        except Exception as e:
+            # Result or exception did not pickle
+            conn.send((False, SandboxError(f"{type(value).__name__}: {value} ({e})"), metrics))
+        if isinstance(value, MemoryError):
+            # The heap may be in a bad state; the next job gets a fresh worker
+            return
+
+
+def _describe_exit(exitcode: Optional[int], limits: SandboxLimits) -> str:
+    if exitcode is not None and exitcode < 0:
+        signum = -exitcode
+        if signum == getattr(signal, "SIGXCPU", None):
+            return f"exceeded the CPU limit of {limits.cpu_seconds}s"
+        if signum == signal.SIGKILL:
+            return "was killed (out of memory?)"
+        return f"crashed ({signal.Signals(signum).name})"
+    return f"exited unexpectedly (code {exitcode})"
+
+
+class _Worker:
+    """One sandboxed process and the pipe to it."""
+
+    def __init__(self, context, limits: SandboxLimits):
+        self.limits = limits
+        self.conn, child_conn = context.Pipe()
+        # Not a daemon: converters start render workers of their own
+        self.process = context.Process(target=_worker_main, args=(child_conn, limits), name="liteswitch-sandbox")
+        self.process.start()
+        child_conn.close()
+
+    def run(self, fn: Callable, args: tuple, kwargs: dict, label: str):
+        try:
+            self.conn.send((fn, args, kwargs))
+            if not self.conn.poll(self.limits.timeout):
+                self.kill()
+                raise SandboxTimeout(f"{label} did not finish within {self.limits.timeout}s")
+            ok, value, metrics = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            self.process.join(5)
+            raise SandboxError(f"{label}: worker {_describe_exit(self.process.exitcode, self.limits)}") from None
+        logger.info(f"{label}: {metrics.wall_seconds:.2f}s wall, {metrics.cpu_seconds:.2f}s CPU"
+                    + (f", worker peak {metrics.peak_rss // (1024 * 1024)} MiB" if metrics.peak_rss else ""))
+        if not ok:
+            if isinstance(value, MemoryError):
+                self.stop()  # The worker quits after a MemoryError
+            raise value
+        return value
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        kill_process_tree(self.process.pid)
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+def _job_label(fn: Callable) -> str:
+    """'pdf_to_png(report.pdf)' for the partials async_converter submits."""
+    args = getattr(fn, "args", ())  # functools.partial(_run_in_process, converter, input_path, ...)
+    if len(args) >= 2 and callable(args[0]) and isinstance(args[1], str):
+        return f"{args[0].__name__}({os.path.basename(args[1])})"
+    return getattr(fn, "__name__", "job")
+
+
+class SandboxExecutor(Executor):
+    """
+    An Executor (usable wherever async_converter takes one) that runs each
+    job in a limited worker process. Up to `max_workers` jobs run at once;
+    workers are reused between jobs and replaced after a crash, a timeout or
+    a MemoryError. Workers are started with the 'spawn' method, so they do
+    not inherit the parent's threads or open documents.
+    """
+
+    def __init__(self, limits: SandboxLimits = SandboxLimits(), max_workers: Optional[int] = None):
+        self.limits = limits
+        self._context = multiprocessing.get_context("spawn")
+        # One thread per running job, blocked on its worker's pipe
+        self._threads = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                           thread_name_prefix="sandbox")
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+        return _Worker(self._context, self.limits)
+
+    def _run(self, fn: Callable, args: tuple, kwargs: dict):
+        worker = self._checkout()
+        try:
+            return worker.run(fn, args, kwargs, _job_label(fn))
+        finally:
+            if worker.alive():
+                with self._lock:
+                    self._idle.append(worker)
+            else:
+                logger.warning("Sandbox worker lost; a fresh one will take the next job")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._threads.submit(self._run, fn, args, kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._threads.shutdown(wait=wait, cancel_futures=cancel_futures)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
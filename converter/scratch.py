@@ -0,0 +1,176 @@
+"""
+Local scratch space for conversions and atomic publishing of their results.
+
+Converters write intermediates and outputs under a scratch directory (tmpfs
+where there is room) and only the finished result is moved next to the input.
+Inputs on a slow network share then see exactly one write per output, and
+readers never observe a half-written file.
+"""
+
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from converter import tracing
+
+logger = logging.getLogger(__name__)
+
+TMPFS_DIR = "/dev/shm"
+# Free space kept on tmpfs for everything else using RAM
+TMPFS_HEADROOM = 256 * 1024 * 1024
+
+
+def scratch_root(size_hint: int = 0) -> str:
+    """
+    Picks the scratch location: $LITESWITCH_SCRATCH_DIR, else tmpfs if it has room
+    for a few times `size_hint` bytes, else the regular temp directory.
+    """
+    override = os.environ.get("LITESWITCH_SCRATCH_DIR")
+    if override:
+        return override
+
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        try:
+            if shutil.disk_usage(TMPFS_DIR).free > TMPFS_HEADROOM + 4 * size_hint:
+                return TMPFS_DIR
+        except OSError:
+            pass
+    return tempfile.gettempdir()
+
+
+def make_scratch_dir(size_hint: int = 0) -> str:
+    """Creates a private scratch directory; the caller must remove it."""
+    return tempfile.mkdtemp(prefix="liteswitch_", dir=scratch_root(size_hint))
+
+
+@contextmanager
+def scratch_dir(size_hint: int = 0) -> Iterator[str]:
+    """A private scratch directory that is deleted with everything in it on exit."""
+    work = make_scratch_dir(size_hint)
+    try:
+        yield work
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _same_filesystem(path: str, directory: str) -> bool:
+    try:
+        return os.stat(path).st_dev == os.stat(directory).st_dev
+    except OSError:
+        return False
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _partial_path(dest: str) -> str:
+    """A hidden name next to `dest`, on its filesystem, so a rename can publish it."""
+    return os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.{uuid.uuid4().hex[:8]}.partial")
+
+
+def publish(src: str, dest: str) -> str:
+    """
+    Moves a finished file or folder from scratch space to `dest`.
+    Across filesystems the data is first copied to a hidden name next to `dest`
+    and then renamed, so the final name only ever points at complete output.
+    (Replacing an existing folder swaps it aside first, which is not atomic.)
+    """
+    with tracing.span("publish", dest=os.path.basename(dest)):
+        return _publish(src, dest)
+
+
+def _publish(src: str, dest: str) -> str:
+    dest = os.path.abspath(dest)
+    dest_dir = os.path.dirname(dest)
+    staging = src
+
+    if not _same_filesystem(src, dest_dir):
+        staging = _partial_path(dest)
+        try:
+            if os.path.isdir(src):
+                shutil.copytree(src, staging)
+            else:
+                shutil.copyfile(src, staging)
+        except BaseException:
+            _remove(staging)
+            raise
+
+    try:
+        if os.path.isdir(staging):
+            old = None
+            if os.path.exists(dest):
+                old = f"{dest}.{uuid.uuid4().hex[:8]}.old"
+                os.rename(dest, old)
+            os.rename(staging, dest)
+            if old:
+                _remove(old)
+        else:
+            os.replace(staging, dest)
+    except BaseException:
+        if staging != src:
+            _remove(staging)
+        raise
+
+    logger.info(f"Published {dest}")
+    return dest
+
+
+def publish_link(existing: str, dest: str) -> str:
+    """
+    Publishes `dest` with the same content as the already published `existing`,
+    as a hard link where the filesystem supports one and as a copy otherwise.
+    """
+    dest = os.path.abspath(dest)
+    staging = _partial_path(dest)
+    try:
+        try:
+            os.link(existing, staging)
+        except OSError:
+            shutil.copyfile(existing, staging)
+        os.replace(staging, dest)
+    except BaseException:
+        _remove(staging)
+        raise
+
+    logger.info(f"Published {dest} (same as {os.path.basename(existing)})")
+    return dest
+
+
+@contextmanager
+def staged_output(final_path: str, size_hint: int = 0) -> Iterator[str]:
+    """
+    Yields a scratch path to write `final_path`'s content to. If the block
+    succeeds the result is published to `final_path`; either way the scratch
+    copy is removed.
+    """
+    with scratch_dir(size_hint) as work:
+        tmp_path = os.path.join(work, os.path.basename(final_path))
+        yield tmp_path
+        publish(tmp_path, final_path)
+
+
+@contextmanager
+def partial_output(final_path: str) -> Iterator[str]:
+    """
+    Yields a hidden path next to `final_path` for output that is streamed to
+    its destination instead of built in scratch space (page archives, which
+    can be many times the size of the input). It is renamed to `final_path`
+    if the block succeeds and removed otherwise.
+    """
+    final_path = os.path.abspath(final_path)
+    partial = _partial_path(final_path)
+    try:
+        yield partial
+        os.replace(partial, final_path)
+    except BaseException:
+        _remove(partial)
+        raise
+    logger.info(f"Published {final_path}")
@@ -0,0 +1,43 @@
+"""Sprite sheets of the thumbnails a batch made (cli.py --sprite)."""
+
+import os
+import json
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from converter.document_converter import THUMBNAIL_SIZE
+from converter.scratch import staged_output
+
+logger = logging.getLogger(__name__)
+
+
+def build_sprite_sheet(thumbnails: Dict[str, str], sprite_path: str,
+                       box: Tuple[int, int] = THUMBNAIL_SIZE, columns: Optional[int] = None) -> str:
+    """
+    Packs thumbnails into one grid image (one box-sized cell each) and writes
+    a JSON index next to it: {source path: {"x", "y", "width", "height"}}.
+    """
+    from PIL import Image
+
+    entries: List[Tuple[str, str]] = [(src, thumb) for src, thumb in thumbnails.items() if thumb]
+    if not entries:
+        raise ValueError("No thumbnails to pack into a sprite sheet.")
+    columns = columns or math.ceil(math.sqrt(len(entries)))
+    rows = math.ceil(len(entries) / columns)
+
+    sheet = Image.new("RGB", (columns * box[0], rows * box[1]), "white")
+    index = {}
+    for i, (source, thumb) in enumerate(entries):
+        x, y = (i % columns) * box[0], (i // columns) * box[1]
+        with Image.open(thumb) as img:
+            sheet.paste(img.convert("RGB"), (x, y))
+            index[source] = {"x": x, "y": y, "width": img.width, "height": img.height}
+
+    with staged_output(sprite_path) as tmp_path:
+        sheet.save(tmp_path)
+    with staged_output(f"{os.path.splitext(sprite_path)[0]}.json") as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+    logger.info(f"Sprite sheet with {len(entries)} thumbnails: {sprite_path}")
+    return sprite_path
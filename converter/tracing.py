@@ -0,0 +1,146 @@
+"""
+Opt-in stage tracing (Chrome trace / Perfetto format) and per-job profiling.
+
+Spans are recorded by every process taking part in a run (the CLI, the
+converter pool, render workers): each appends its events to its own file
+in the directory named by $LITESWITCH_TRACE_DIR, and finish_trace() merges
+them into one trace that chrome://tracing or ui.perfetto.dev can open.
+With $LITESWITCH_PROFILE_DIR set, profiled() writes one cProfile .pstats
+file per job there. Both are off (and nearly free) unless enabled.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import tempfile
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV = "LITESWITCH_TRACE_DIR"
+PROFILE_ENV = "LITESWITCH_PROFILE_DIR"
+
+_event_file = None
+_event_file_pid = None
+_lock = threading.Lock()
+_profile_numbers = itertools.count(1)
+
+
+def tracing_enabled() -> bool:
+    return bool(os.environ.get(TRACE_ENV))
+
+
+def now_us() -> int:
+    # Wall clock, so events from different processes line up
+    return time.time_ns() // 1000
+
+
+def _write_event(event: dict) -> None:
+    global _event_file, _event_file_pid
+    with _lock:
+        if _event_file is None or _event_file_pid != os.getpid():
+            # First event of this process (a forked worker must not share its parent's file)
+            path = os.path.join(os.environ[TRACE_ENV], f"events_{os.getpid()}.jsonl")
+            _event_file = open(path, "a", encoding="utf-8")
+            _event_file_pid = os.getpid()
+        _event_file.write(json.dumps(event) + "\n")
+        _event_file.flush()
+
+
+def record(name: str, cat: str, start_us: int, end_us: int, tid: Optional[int] = None, **args) -> None:
+    """Records a finished span (timestamps from now_us())."""
+    if not tracing_enabled():
+        return
+    _write_event({"name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": max(0, end_us - start_us),
+                  "pid": os.getpid(), "tid": tid if tid is not None else threading.get_native_id(),
+                  "args": {k: str(v) for k, v in args.items()}})
+
+
+def name_track(tid: int, name: str) -> None:
+    """Labels a track (e.g. one per job or subprocess) in the trace viewer."""
+    if tracing_enabled():
+        _write_event({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                      "args": {"name": name}})
+
+
+@contextmanager
+def span(name: str, cat: str = "stage", tid: Optional[int] = None, **args) -> Iterator[None]:
+    """Times the block as one span. Spans on one thread must nest; pass `tid` for overlapping work."""
+    if not tracing_enabled():
+        yield
+        return
+    start = now_us()
+    try:
+        yield
+    finally:
+        record(name, cat, start, now_us(), tid, **args)
+
+
+def start_trace() -> str:
+    """Enables tracing for this process and the ones it starts; returns the event directory."""
+    trace_dir = tempfile.mkdtemp(prefix="liteswitch_trace_")
+    os.environ[TRACE_ENV] = trace_dir
+    return trace_dir
+
+
+def finish_trace(out_path: str) -> str:
+    """Merges every process's events into one Chrome trace at out_path and disables tracing."""
+    global _event_file
+    trace_dir = os.environ.pop(TRACE_ENV)
+    with _lock:
+        if _event_file is not None:
+            _event_file.close()
+            _event_file = None
+
+    events = []
+    for entry in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, entry), "r", encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+        pid = int(re.search(r"\d+", entry).group())
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                       "args": {"name": "liteswitch" if pid == os.getpid() else f"worker {pid}"}})
+    shutil.rmtree(trace_dir, ignore_errors=True)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    logger.info(f"Wrote {len(events)} trace events to {out_path}")
+    return out_path
+
+
+def start_profiling(profile_dir: str) -> None:
+    """Makes profiled() write .pstats files into profile_dir (here and in child processes)."""
+    os.makedirs(profile_dir, exist_ok=True)
+    os.environ[PROFILE_ENV] = os.path.abspath(profile_dir)
+
+
+@contextmanager
+def profiled(input_path: str, target_ext: str) -> Iterator[None]:
+    """Runs the block under cProfile and saves name.target.pstats, if profiling is enabled."""
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not profile_dir:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process (e.g. two finalize threads)
+        logger.warning(f"Not profiling {input_path}: another job is being profiled")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stem = os.path.splitext(os.path.basename(input_path))[0]
+        target = re.sub(r"[^\w]+", "_", target_ext)
+        path = os.path.join(profile_dir, f"{stem}.{target}.{os.getpid()}-{next(_profile_numbers)}.pstats")
+        profiler.dump_stats(path)
+        logger.info(f"Profile written to {path}")
@@ -0,0 +1,340 @@
+"""
+Load test for LiteSwitch.
+
+Generates a mixed synthetic corpus, then fires conversions at a fixed rate,
+either as separate `cli.py --to X` runs (as the context menu does) or as
+in-process convert_async() calls, and reports throughput, latency
+percentiles and failure rates per conversion pair.
+
+    python load_test.py --mode cli --rate 4 --requests 200 --pairs pdf:png,png:pdf,docx:pdf --stub-office
+
+--stub-office replaces LibreOffice with a small script that writes plausible
+output after a delay, so office conversions can be load-tested anywhere.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import random
+import shutil
+import asyncio
+import zipfile
+import argparse
+import tempfile
+from typing import Dict, List, NamedTuple, Optional
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_PATH = os.path.join(REPO_DIR, "cli.py")
+
+DEFAULT_PAIRS = "pdf:png,pdf:txt,pdf:md,pdf:thumbnail,png:pdf,png:thumbnail,docx:pdf,pptx:pdf"
+WORDS = ("switch convert page render office slide export format batch light quick "
+         "document image text table figure section summary result").split()
+
+
+# --- Synthetic corpus (no third-party packages needed) ---
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_pdf(path: str, pages: int, rng: Optional[random.Random] = None,
+             width: int = 612, height: int = 792) -> str:
+    """A text PDF; every 10th page is an identical section divider (exercises page dedup)."""
+    rng = rng or random.Random(0)
+    objects = {1: "<< /Type /Catalog /Pages 2 0 R >>",
+               3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for i in range(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        if i % 10 == 9:
+            content = f"0.2 0.3 0.6 rg 0 0 {width} {height} re f BT /F1 36 Tf 1 1 1 rg 72 {height // 2} Td (Section) Tj ET"
+        else:
+            lines = [f"BT /F1 20 Tf 72 {height - 72} Td (Page {i + 1}) Tj ET"]
+            for n in range(30):
+                lines.append(f"BT /F1 11 Tf 72 {height - 110 - n * 20} Td ({_sentence(rng)}) Tj ET")
+            content = "\n".join(lines)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        objects[content_id] = f"<< /Length {len(content)} >>\nstream\n{content}\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for obj_id in sorted(objects):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def make_png(path: str, width: int, height: int) -> str:
+    """An RGB gradient."""
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)  # Filter: none
+        rows += bytes((x * 255 // width, y * 255 // height, 128)[c] for x in range(width) for c in range(3))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    png = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(bytes(rows), 6)) + chunk(b"IEND", b""))
+    with open(path, "wb") as f:
+        f.write(png)
+    return path
+
+
+def make_docx(path: str, paragraphs: int, rng: Optional[random.Random] = None) -> str:
+    """A minimal WordprocessingML document."""
+    rng = rng or random.Random(0)
+    body = "".join(f"<w:p><w:r><w:t>{_sentence(rng, 40)}</w:t></w:r></w:p>" for _ in range(paragraphs))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml",
+                   '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                   '</Types>')
+        z.writestr("_rels/.rels",
+                   '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+                   '</Relationships>')
+        z.writestr("word/document.xml",
+                   '<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   f'<w:body>{body}</w:body></w:document>')
+    return path
+
+
+def make_pptx(path: str, slides: int) -> Optional[str]:
+    """Needs python-pptx; returns None without it."""
+    try:
+        from pptx import Presentation
+    except ImportError:
+        return None
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {i + 1}"
+        slide.placeholders[1].text = _sentence(random.Random(i), 20)
+    prs.save(path)
+    return path
+
+
+def build_corpus(corpus_dir: str, seed: int = 0) -> Dict[str, List[str]]:
+    """Small, medium and large files of every type. Returns {extension: paths}."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(seed)
+    corpus: Dict[str, List[str]] = {"pdf": [], "png": [], "docx": [], "pptx": []}
+    for pages in (1, 12, 60):
+        corpus["pdf"].append(make_pdf(os.path.join(corpus_dir, f"doc_{pages}p.pdf"), pages, rng))
+    for width, height in ((320, 240), (1600, 1200)):
+        corpus["png"].append(make_png(os.path.join(corpus_dir, f"image_{width}x{height}.png"), width, height))
+    for paragraphs in (5, 200):
+        corpus["docx"].append(make_docx(os.path.join(corpus_dir, f"text_{paragraphs}.docx"), paragraphs, rng))
+    for slides in (3, 30):
+        deck = make_pptx(os.path.join(corpus_dir, f"deck_{slides}.pptx"), slides)
+        if deck:
+            corpus["pptx"].append(deck)
+    return {ext: paths for ext, paths in corpus.items() if paths}
+
+
+# --- Stub office binary ---
+
+def stub_office_main(argv: List[str]) -> int:
+    """Stands in for `soffice --headless --convert-to FMT --outdir DIR INPUT`."""
+    fmt = argv[argv.index("--convert-to") + 1].split(":")[0]
+    out_dir = argv[argv.index("--outdir") + 1]
+    input_path = argv[-1]
+    time.sleep(float(os.environ.get("LITESWITCH_STUB_DELAY", "0.3")))  # Office start-up
+    out_path = os.path.join(out_dir, f"{os.path.splitext(os.path.basename(input_path))[0]}.{fmt}")
+    if fmt == "pdf":
+        make_pdf(out_path, max(1, os.path.getsize(input_path) // 20000))
+    elif fmt == "docx":
+        make_docx(out_path, 10)
+    else:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(f"Converted by the LiteSwitch stub office from {input_path}\n")
+    return 0
+
+
+def install_stub_office(stub_dir: str) -> str:
+    """Writes an executable `soffice` that runs stub_office_main()."""
+    os.makedirs(stub_dir, exist_ok=True)
+    path = os.path.join(stub_dir, "soffice")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable}\n"
+                f"import sys\nsys.path.insert(0, {REPO_DIR!r})\n"
+                "from load_test import stub_office_main\n"
+                "sys.exit(stub_office_main(sys.argv[1:]))\n")
+    os.chmod(path, 0o755)
+    return path
+
+
+# --- Load generation ---
+
+class Result(NamedTuple):
+    pair: str
+    latency: float  # Seconds from arrival (including queueing) to completion
+    ok: bool
+    error: str
+
+
+def _stage_input(source: str, run_dir: str, index: int) -> str:
+    """Each request gets its own copy, so concurrent outputs never collide."""
+    work = os.path.join(run_dir, f"req_{index}")
+    os.makedirs(work)
+    return shutil.copy(source, work)
+
+
+async def _cli_request(input_path: str, target: str, cli_args: List[str]) -> Optional[str]:
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, CLI_PATH, input_path, "--to", target, "--quiet", *cli_args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        return (stderr or stdout).decode(errors="replace").strip()[-300:] or f"exit {proc.returncode}"
+    return None
+
+
+async def _api_request(input_path: str, target: str) -> Optional[str]:
+    from converter.async_converter import convert_async
+    try:
+        await convert_async(input_path, target)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+async def run_load(corpus: Dict[str, List[str]], pairs: List[str], mode: str, rate: float,
+                   requests: int, concurrency: int, run_dir: str, cli_args: List[str],
+                   seed: int = 0) -> List[Result]:
+    """Open-loop load: requests arrive every 1/rate seconds whether or not earlier ones finished."""
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Result] = []
+
+    async def one(index: int, pair: str) -> None:
+        source_ext, target = pair.split(":")
+        arrived = time.perf_counter()
+        async with semaphore:
+            input_path = _stage_input(rng.choice(corpus[source_ext]), run_dir, index)
+            if mode == "cli":
+                error = await _cli_request(input_path, target, cli_args)
+            else:
+                error = await _api_request(input_path, target)
+        results.append(Result(pair, time.perf_counter() - arrived, error is None, error or ""))
+        shutil.rmtree(os.path.dirname(input_path), ignore_errors=True)
+
+    tasks = []
+    for index in range(requests):
+        tasks.append(asyncio.create_task(one(index, pairs[index % len(pairs)])))
+        await asyncio.sleep(rng.expovariate(rate) if rate > 0 else 0)
+    await asyncio.gather(*tasks)
+    if mode == "api":
+        from converter.async_converter import shutdown_executor
+        shutdown_executor()
+    return results
+
+
+# --- Report ---
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(results: List[Result], wall_time: float) -> Dict[str, dict]:
+    report = {}
+    for pair in sorted({r.pair for r in results}) + ["all"]:
+        subset = [r for r in results if pair in ("all", r.pair)]
+        latencies = [r.latency for r in subset if r.ok]
+        failures = [r for r in subset if not r.ok]
+        report[pair] = {
+            "requests": len(subset),
+            "failures": len(failures),
+            "failure_rate": len(failures) / len(subset),
+            "throughput_per_s": len(latencies) / wall_time if wall_time else 0.0,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "p99_s": percentile(latencies, 99),
+            "first_error": failures[0].error if failures else "",
+        }
+    return report
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    print(f"{'pair':<16}{'reqs':>6}{'fail%':>8}{'ok/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for pair, row in report.items():
+        print(f"{pair:<16}{row['requests']:>6}{row['failure_rate'] * 100:>7.1f}%{row['throughput_per_s']:>8.2f}"
+              f"{row['p50_s']:>8.2f}s{row['p95_s']:>8.2f}s{row['p99_s']:>8.2f}s")
+    for pair, row in report.items():
+        if row["first_error"] and pair != "all":
+            print(f"  {pair}: {row['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LiteSwitch load test")
+    parser.add_argument("--mode", choices=("cli", "api"), default="cli",
+                        help="cli: one cli.py process per request; api: convert_async() in this process")
+    parser.add_argument("--pairs", default=DEFAULT_PAIRS, help="Comma-separated source:target pairs")
+    parser.add_argument("--rate", type=float, default=2.0, help="Mean arrivals per second (0: all at once)")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at most")
+    parser.add_argument("--corpus", help="Corpus folder (generated if missing; default: a temporary one)")
+    parser.add_argument("--stub-office", action="store_true", help="Use a stub instead of LibreOffice")
+    parser.add_argument("--stub-delay", type=float, default=0.3, help="Seconds the stub office takes per file")
+    parser.add_argument("--cli-args", default="", help="Extra arguments for every cli.py run, e.g. '--jobs 2'")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_root = tempfile.mkdtemp(prefix="liteswitch_load_")
+    # Synthetic runs must not skew the throughput cli.py --estimate learns from
+    os.environ["LITESWITCH_STATS_PATH"] = os.path.join(run_root, "throughput.json")
+    try:
+        if args.stub_office:
+            # Read when converter.document_converter is imported, here and in cli.py children
+            os.environ["LITESWITCH_OFFICE_BIN"] = install_stub_office(os.path.join(run_root, "stub"))
+            os.environ["LITESWITCH_STUB_DELAY"] = str(args.stub_delay)
+        corpus = build_corpus(args.corpus or os.path.join(run_root, "corpus"), args.seed)
+
+        pairs = [p.strip() for p in args.pairs.split(",") if p.strip()]
+        missing = sorted({p.split(":")[0] for p in pairs} - set(corpus))
+        if missing:
+            print(f"No corpus files for: {', '.join(missing)} (skipping those pairs)")
+            pairs = [p for p in pairs if p.split(":")[0] in corpus]
+        if not pairs:
+            sys.exit(1)
+
+        run_dir = os.path.join(run_root, "runs")
+        os.makedirs(run_dir)
+        print(f"{args.requests} {args.mode} requests at {args.rate}/s over {len(pairs)} pair(s)...")
+        start = time.perf_counter()
+        results = asyncio.run(run_load(corpus, pairs, args.mode, args.rate, args.requests,
+                                       args.concurrency, run_dir, args.cli_args.split(), args.seed))
+        report = summarize(results, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(run_root, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ from converter.document_converter import CONVERSION_MAP
 
 APP_NAME = "LiteSwitch"
 CLI_PATH = os.path.abspath("cli.py")
+# Targets without a context-menu verb: thumbnails are for scripted batches (cli.py --to thumbnail)
+MENU_HIDDEN_TARGETS = {"thumbnail"}
 # Use pythonw.exe to avoid terminal popup
 PYTHON_EXEC = sys.executable.replace("python.exe", "pythonw.exe")
 
@@ -71,7 +73,9 @@ def register_linux():
     # MimeTypes for office docs + pdf
     mimes = "application/pdf;application/vnd.openxmlformats-officedocument.wordprocessingml.document;application/vnd.openxmlformats-officedocument.presentationml.presentation;"
     
-    # Exec command: python /path/to/cli.py %f --to pdf (Default behavior?)
+    # Exec command: python /path/to/cli.py %F --to pdf
+    # %F hands the whole selection to ONE process, so cli.main sees the full batch
+    # (instead of one cold Python + LibreOffice start per file with %f).
     # Context menu usually implies options. 
     # Since standard "Open With" just passes the file, we can't easily have sub-menus (to pdf, to png) without Actions.
     
@@ -88,15 +92,15 @@ Actions=ConvertToPDF;ConvertToPNG;ConvertToTXT;
 
 [Desktop Action ConvertToPDF]
 Name=Convert to PDF
-Exec={sys.executable} "{CLI_PATH}" "%f" --to pdf
+Exec={sys.executable} "{CLI_PATH}" %F --to pdf
 
 [Desktop Action ConvertToPNG]
 Name=Convert to PNG
-Exec={sys.executable} "{CLI_PATH}" "%f" --to png
+Exec={sys.executable} "{CLI_PATH}" %F --to png
 
 [Desktop Action ConvertToTXT]
 Name=Convert to TXT
-Exec={sys.executable} "{CLI_PATH}" "%f" --to txt
+Exec={sys.executable} "{CLI_PATH}" %F --to txt
 """
     
     with open(desktop_path, "w") as f:
@@ -142,15 +146,20 @@ def register_menu():
             winreg.CreateKey(winreg.HKEY_CURRENT_USER, shell_key_path)
             
             for target_ext, _ in targets.items():
+                if target_ext in MENU_HIDDEN_TARGETS:
+                    continue
                 # Sub-item Key: ...\LiteSwitch\shell\to_format
                 sub_key_path = f"{shell_key_path}\\{APP_NAME}_to_{target_ext}"
                 menu_text = f"to {target_ext.upper()}"
-                command = f'"{PYTHON_EXEC}" "{CLI_PATH}" "%1" --to {target_ext}'
+                # Explorer starts one process per selected file; --collect merges them into one batch
+                command = f'"{PYTHON_EXEC}" "{CLI_PATH}" "%1" --to {target_ext} --collect'
                 
                 # Create Sub-item
                 sub_key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, sub_key_path)
                 winreg.SetValueEx(sub_key, "", 0, winreg.REG_SZ, menu_text)
                 winreg.SetValueEx(sub_key, "Icon", 0, winreg.REG_SZ, icon_path) # Add Icon to submenu too
+                # Without this, Explorer hides the verb when more than 15 files are selected
+                winreg.SetValueEx(sub_key, "MultiSelectModel", 0, winreg.REG_SZ, "Player")
                 
                 # Command
                 cmd_key = winreg.CreateKey(sub_key, "command")
@@ -1,8 +1,11 @@
 import unittest
+import asyncio
+import time
 import os
 import shutil
 import logging
 import sys
+import importlib.util
 from unittest.mock import MagicMock, patch
 
 # Mock win32com before importing converter
@@ -12,6 +15,7 @@ sys.modules["pythoncom"] = MagicMock()
 
 # Now import the module under test
 from converter import document_converter
+from converter import external, async_converter, scratch
 
 # Setup test logger
 logging.basicConfig(level=logging.INFO)
@@ -55,5 +59,637 @@ class TestLiteSwitch(unittest.TestCase):
         self.assertTrue(hasattr(document_converter, "pdf_to_pptx"))
         self.assertTrue(hasattr(document_converter, "logger"))
 
+class TestExternalJobs(unittest.TestCase):
+
+    def make_job(self, code, output="done"):
+        cmd = [sys.executable, "-c", code]
+        return external.ExternalJob("Test job", cmd, lambda: output)
+
+    def test_run_external_job(self):
+        """A clean exit returns whatever finalize() produces."""
+        self.assertEqual(external.run_external_job(self.make_job("pass")), "done")
+
+    def test_run_external_job_failure(self):
+        """A non-zero exit raises with the job label."""
+        with self.assertRaises(Exception) as ctx:
+            external.run_external_job(self.make_job("import sys; sys.exit(3)"))
+        self.assertIn("Test job", str(ctx.exception))
+
+    def test_run_external_job_async(self):
+        """The async runner drives several jobs on one loop."""
+        async def run_all():
+            jobs = [self.make_job("pass", output=str(i)) for i in range(5)]
+            return await asyncio.gather(*(external.run_external_job_async(j) for j in jobs))
+        self.assertEqual(asyncio.run(run_all()), ["0", "1", "2", "3", "4"])
+
+    def test_async_finalize_keeps_only_fitz_steps_on_the_fitz_thread(self):
+        """Finalizers run side by side; the fitz steps inside them all run on one thread."""
+        import threading
+        fitz_threads, started = set(), threading.Barrier(3, timeout=5)
+
+        def finalize():
+            started.wait()  # All three finalizers are running at once
+            external.on_fitz_thread(lambda: fitz_threads.add(threading.current_thread().name))
+            return threading.current_thread().name
+
+        async def run_all():
+            jobs = [external.ExternalJob("Test job", [sys.executable, "-c", "pass"], finalize) for _ in range(3)]
+            return await asyncio.gather(*(external.run_external_job_async(j) for j in jobs))
+        self.assertFalse(any(name.startswith("fitz") for name in asyncio.run(run_all())))
+        self.assertEqual(len(fitz_threads), 1)
+        self.assertTrue(fitz_threads.pop().startswith("fitz"))
+
+    def test_timeout_kills_and_raises(self):
+        """A hung tool is killed at its timeout instead of blocking the batch."""
+        job = self.make_job("import time; time.sleep(30)")._replace(timeout=0.5)
+        with self.assertRaises(external.ExternalTimeout):
+            external.run_external_job(job)
+
+    def test_timeout_retries_once(self):
+        """A timed-out job is retried once with the command its retry hook yields."""
+        from contextlib import contextmanager
+
+        @contextmanager
+        def retry():
+            yield [sys.executable, "-c", "pass"]
+
+        job = self.make_job("import time; time.sleep(30)")._replace(timeout=0.5, retry=retry)
+        self.assertEqual(external.run_external_job(job), "done")
+        self.assertEqual(asyncio.run(external.run_external_job_async(job)), "done")
+
+    def test_windows_reap_spares_other_jobs_servers(self):
+        """COM servers that were running before a job started are not its orphans."""
+        with patch.object(external.platform, "system", return_value="Windows"), \
+                patch.object(external, "com_server_pids", return_value={10, 11, 12}), \
+                patch.object(external, "kill_process_tree") as kill:
+            self.assertEqual(external.reap_orphans("POWERPNT.EXE", ["/Automation"], spare={10, 11}), 1)
+        kill.assert_called_once_with(12)
+
+    def test_office_profile_argument(self):
+        cmd = document_converter.with_office_profile(["soffice", "--headless"], "/tmp/profile")
+        self.assertEqual(cmd, ["soffice", "-env:UserInstallation=file:///tmp/profile", "--headless"])
+
+    def test_convert_async_rejects_unknown_target(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(async_converter.convert_async("file.pdf", "xyz"))
+
+class TestTracing(unittest.TestCase):
+
+    def test_trace_records_stages_and_subprocesses(self):
+        import json
+        import tempfile
+        from converter import tracing
+        with tempfile.TemporaryDirectory() as root, patch.dict(os.environ):
+            tracing.start_trace()
+            with tracing.span("open"):
+                pass
+            job = external.ExternalJob("Test job", [sys.executable, "-c", "pass"], lambda: "done")
+            external.run_external_job(job)
+            out_path = tracing.finish_trace(os.path.join(root, "trace.json"))
+            with open(out_path) as f:
+                events = json.load(f)["traceEvents"]
+        spans = {e["name"]: e for e in events if e["ph"] == "X"}
+        self.assertEqual(set(spans), {"open", "Test job", "finalize"})
+        self.assertEqual(spans["Test job"]["cat"], "subprocess")
+        self.assertFalse(tracing.tracing_enabled())
+
+    def test_profile_written_per_job(self):
+        import tempfile
+        from converter import tracing
+        with tempfile.TemporaryDirectory() as root, patch.dict(os.environ):
+            tracing.start_profiling(root)
+            with tracing.profiled("/docs/report.pdf", "png"):
+                sum(range(100))
+            self.assertEqual(len([f for f in os.listdir(root) if f.startswith("report.png.")]), 1)
+
+class TestSandbox(unittest.TestCase):
+
+    def test_failed_worker_is_replaced(self):
+        """A crash or an overrun fails only its own job; the next job gets a fresh worker."""
+        from converter.sandbox import SandboxExecutor, SandboxLimits, SandboxError, SandboxTimeout, GIB
+        with SandboxExecutor(SandboxLimits(memory=GIB, cpu_seconds=None, timeout=2), max_workers=1) as pool:
+            first = pool.submit(os.getpid).result()
+            self.assertEqual(pool.submit(os.getpid).result(), first)
+            with self.assertRaises(SandboxTimeout):
+                pool.submit(time.sleep, 10).result()
+            with self.assertRaises(SandboxError):
+                pool.submit(os._exit, 3).result()
+            if sys.platform != "win32":
+                with self.assertRaises(MemoryError):
+                    pool.submit(bytearray, 4 * GIB).result()
+            self.assertNotEqual(pool.submit(os.getpid).result(), first)
+
+class TestOfficeProfilePool(unittest.TestCase):
+
+    def test_slots_are_exclusive(self):
+        """Each running office instance gets its own profile; a full pool reports busy."""
+        import tempfile
+        from converter.office_pool import OfficeProfilePool
+        with tempfile.TemporaryDirectory() as root:
+            pool = OfficeProfilePool(root, 2)
+            first = pool.try_acquire()
+            second = pool.try_acquire()
+            self.assertNotEqual(first[0], second[0])
+            self.assertIsNone(pool.try_acquire())
+            pool.release(first[1])
+            third = pool.try_acquire()
+            self.assertEqual(third[0], first[0])
+            pool.release(second[1])
+            pool.release(third[1])
+
+    def test_env_caps_office_workers(self):
+        """--jobs may lower the number of office instances but not raise it above $LITESWITCH_OFFICE_WORKERS."""
+        size = document_converter.OFFICE_POOL.size
+        self.addCleanup(setattr, document_converter.OFFICE_POOL, "size", size)
+        with patch.object(document_converter, "OFFICE_WORKERS_LIMIT", 2):
+            document_converter.set_office_workers(8)
+            self.assertEqual(document_converter.OFFICE_POOL.size, 2)
+            document_converter.set_office_workers(1)
+            self.assertEqual(document_converter.OFFICE_POOL.size, 1)
+
+    def test_bad_office_workers_env_is_ignored(self):
+        for value, expected in (("4", 4), ("four", None), ("-2", None), ("", None)):
+            with patch.dict(os.environ, {"LITESWITCH_OFFICE_WORKERS": value}):
+                self.assertEqual(document_converter._office_workers_limit(), expected)
+
+class TestScratch(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_staged_output_publishes_on_success(self):
+        out = os.path.join(self.tmp.name, "staged.txt")
+        with scratch.staged_output(out) as tmp_path:
+            self.assertNotEqual(os.path.dirname(tmp_path), os.path.dirname(out))
+            with open(tmp_path, "w") as f:
+                f.write("done")
+            self.assertFalse(os.path.exists(out))
+        with open(out) as f:
+            self.assertEqual(f.read(), "done")
+        self.assertFalse(os.path.exists(tmp_path))
+
+    def test_staged_output_discards_on_failure(self):
+        out = os.path.join(self.tmp.name, "failed.txt")
+        with self.assertRaises(RuntimeError):
+            with scratch.staged_output(out) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    f.write("half")
+                raise RuntimeError("converter crashed")
+        self.assertFalse(os.path.exists(out))
+        self.assertFalse(os.path.exists(tmp_path))
+
+    def test_publish_replaces_folder(self):
+        dest = os.path.join(self.tmp.name, "slides")
+        os.makedirs(os.path.join(dest, "stale"), exist_ok=True)
+        with scratch.scratch_dir() as work:
+            src = os.path.join(work, "slides")
+            os.makedirs(src)
+            open(os.path.join(src, "Slide_1.png"), "w").close()
+            scratch.publish(src, dest)
+        self.assertEqual(os.listdir(dest), ["Slide_1.png"])
+
+    def test_partial_output_streams_next_to_the_destination(self):
+        out = os.path.join(self.tmp.name, "pages.zip")
+        with scratch.partial_output(out) as tmp_path:
+            self.assertEqual(os.path.dirname(tmp_path), self.tmp.name)
+            with open(tmp_path, "w") as f:
+                f.write("pages")
+        self.assertEqual(os.listdir(self.tmp.name), ["pages.zip"])
+        with self.assertRaises(RuntimeError):
+            with scratch.partial_output(os.path.join(self.tmp.name, "failed.zip")) as tmp_path:
+                open(tmp_path, "w").close()
+                raise RuntimeError("converter crashed")
+        self.assertEqual(os.listdir(self.tmp.name), ["pages.zip"])
+
+class TestRaster(unittest.TestCase):
+
+    def test_fit_zoom_matches_slide_export_size(self):
+        """A 16:9 slide (720x405pt) fills 1920x1080; a 4:3 one is limited by height."""
+        from converter import raster
+        self.assertAlmostEqual(raster.fit_zoom(720, 405, raster.SLIDE_PNG_SIZE) * 720, 1920)
+        self.assertAlmostEqual(raster.fit_zoom(720, 540, raster.SLIDE_PNG_SIZE) * 540, 1080)
+
+    def test_options_fall_back_to_converter_defaults(self):
+        from converter import raster
+        options = raster.RasterOptions(fmt="jpeg").resolve(raster.PDF_PNG_OPTIONS)
+        self.assertEqual(options.dpi, 216)
+        self.assertEqual(options.extension, "jpg")
+        self.assertEqual(options.quality, 90)
+
+    def test_page_renderers_resolve_their_default_options(self):
+        from converter import raster
+        with patch.object(raster, "_render_chunk", return_value=[]) as render:
+            raster.render_pdf_pages("deck.pdf", "slides", pages=[0])
+        options = render.call_args[0][4]
+        # fmt=None would send PNG output down the Pillow path without a compression level
+        self.assertEqual((options.fmt, options.box), ("png", raster.SLIDE_PNG_SIZE))
+
+    def test_options_are_validated_up_front(self):
+        from converter import raster
+        for bad in ({"quality": 0}, {"quality": 101}, {"dpi": 0}, {"max_pixels": -1}, {"fmt": "gif"}):
+            with self.assertRaises(ValueError):
+                raster.RasterOptions(**bad)
+
+    def test_dpi_replaces_default_box(self):
+        """An explicit DPI is not combined with the converter's default fit box."""
+        from converter import raster
+        options = raster.RasterOptions(dpi=96).resolve(raster.SLIDE_PNG_OPTIONS)
+        self.assertIsNone(options.box)
+        self.assertAlmostEqual(options.zoom(720, 405), 96 / 72)
+
+    def test_max_pixels_caps_zoom(self):
+        from converter import raster
+        options = raster.RasterOptions(dpi=300, max_pixels=612 * 792).resolve(raster.BASE_OPTIONS)
+        self.assertAlmostEqual(options.zoom(612, 792), 1.0)
+
+    def test_thumbnail_paths(self):
+        path = document_converter.thumbnail_path("/docs/a.pdf", 1, "png")
+        self.assertEqual(path, "/docs/a_LiteSwitch_thumb.png")
+        path = document_converter.thumbnail_path("/docs/a.pdf", 2, "jpg", "/thumbs")
+        self.assertEqual(os.path.dirname(path), "/thumbs")
+        self.assertRegex(os.path.basename(path), r"^a_[0-9a-f]{8}_LiteSwitch_thumb_page_2\.jpg$")
+        # Same name in another folder: another thumbnail
+        self.assertNotEqual(document_converter.thumbnail_path("/other/a.pdf", 2, "jpg", "/thumbs"), path)
+
+    def test_convert_passes_only_accepted_options(self):
+        def fake(input_path, raster=None):
+            return raster
+        self.assertEqual(document_converter.accepted_options(fake, {"raster": 1, "other": 2}), {"raster": 1})
+
+    def test_repeated_pages_are_produced_once(self):
+        from converter.raster import PageCache
+        def pix(samples):
+            return MagicMock(width=2, height=1, n=3, samples=samples)
+        options = MagicMock()
+        options.render.side_effect = [pix(b"divider"), pix(b"content"), pix(b"divider")]
+        produce = MagicMock(side_effect=["page_1.png", "page_2.png"])
+        cache = PageCache(options)
+        results = [cache.get(MagicMock(), produce) for _ in range(3)]
+        self.assertEqual(results, [("page_1.png", False), ("page_2.png", False), ("page_1.png", True)])
+        self.assertEqual(produce.call_count, 2)
+
+    def test_blank_pages_skipped_or_collapsed(self):
+        from converter import raster
+        blank = [False, True, True, False, True]
+        for mode, kept in (("keep", [0, 1, 2, 3, 4]), ("skip", [0, 3]), ("collapse", [0, 1, 3, 4])):
+            with patch.object(raster, "is_blank_page", side_effect=blank) as probe:
+                blanks = raster.BlankPageFilter(mode)
+                self.assertEqual([n for n in range(5) if not blanks.drop(n)], kept)
+                self.assertEqual(probe.call_count, 0 if mode == "keep" else 5)
+        with self.assertRaises(ValueError):
+            raster.BlankPageFilter("hide")
+
+    def test_multi_target_split(self):
+        self.assertEqual(document_converter.parse_targets("PNG, .txt,md"), ["png", "txt", "md"])
+        shared, separate = document_converter.split_targets("pdf", ["png", "docx", "md"])
+        self.assertEqual((shared, separate), (["png", "md"], ["docx"]))
+        # A single page-based target gains nothing from the shared pass
+        self.assertEqual(document_converter.split_targets("pdf", ["png", "docx"]), ([], ["png", "docx"]))
+        with self.assertRaises(ValueError):
+            document_converter.convert("test.pdf", "png,mp3")
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "needs NumPy")
+    def test_blank_samples(self):
+        import numpy as np
+        from converter.raster import is_blank_samples
+        scan = np.full((200, 150), 235, dtype=np.uint8)  # Gray paper
+        scan[5, 7] = scan[100, 80] = 40                    # Dust
+        self.assertTrue(is_blank_samples(scan))
+        scan[90:110, 20:130] = 30                          # A line of text
+        self.assertFalse(is_blank_samples(scan))
+
+class TestPdfOptimize(unittest.TestCase):
+
+    def test_pdf_optimize_is_opt_in(self):
+        from converter.pdf_optimize import PDF_OPTIMIZE_PRESETS
+        self.assertEqual(set(PDF_OPTIMIZE_PRESETS), {"lossless", "screen", "print"})
+        self.assertIsNone(PDF_OPTIMIZE_PRESETS["lossless"].image_dpi)
+        self.assertIsNone(document_converter.optimized_pdf_publisher("out.pdf", None))
+        self.assertIsNotNone(document_converter.optimized_pdf_publisher("out.pdf", "screen"))
+
+    def _photo_pdf(self, path):
+        """One 2x2 inch page showing a 1200x1200 px noise image (600 dpi), stored uncompressed."""
+        import fitz
+        side = 1200
+        pix = fitz.Pixmap(fitz.csRGB, side, side, os.urandom(side * side * 3), False)
+        with fitz.open() as doc:
+            page = doc.new_page(width=144, height=144)
+            page.insert_image(page.rect, pixmap=pix)
+            doc.save(path)
+        return path
+
+    @unittest.skipUnless(importlib.util.find_spec("fitz"), "needs PyMuPDF")
+    def test_screen_preset_shrinks_large_images(self):
+        import fitz
+        import tempfile
+        from converter.pdf_optimize import optimize_pdf
+        if not hasattr(fitz.Document, "rewrite_images"):
+            self.skipTest("needs PyMuPDF 1.25.4+")
+        with tempfile.TemporaryDirectory() as root:
+            path = self._photo_pdf(os.path.join(root, "photo.pdf"))
+            before = os.path.getsize(path)
+            self.assertEqual(optimize_pdf(path, "screen"), path)
+            self.assertLess(os.path.getsize(path), before // 4)
+            with fitz.open(path) as doc:
+                self.assertEqual(doc.page_count, 1)
+
+    @unittest.skipUnless(importlib.util.find_spec("fitz"), "needs PyMuPDF")
+    def test_compact_pdf_is_left_byte_identical(self):
+        import fitz
+        import tempfile
+        from converter.pdf_optimize import optimize_pdf
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "empty.pdf")
+            with fitz.open() as doc:
+                doc.new_page()
+                doc.save(path)
+            optimize_pdf(path, "lossless")  # Now as small as the lossless rewrite gets
+            with open(path, "rb") as f:
+                minimal = f.read()
+            optimize_pdf(path, "lossless")
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), minimal)
+            self.assertEqual(os.listdir(root), ["empty.pdf"])
+
+class TestHtmlExport(unittest.TestCase):
+
+    def test_identical_images_are_written_once(self):
+        import tempfile
+        from converter.html_export import ImageStore
+        with tempfile.TemporaryDirectory() as files_dir:
+            images = ImageStore(doc=None, files_dir=files_dir)
+            first = images.write(b"logo", "png")
+            self.assertEqual(images.write(b"logo", "png"), first)
+            self.assertNotEqual(images.write(b"photo", "jpeg"), first)
+            self.assertEqual(len(os.listdir(files_dir)), 2)
+            self.assertEqual(images.count, 2)
+
+    def test_unknown_image_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            document_converter.pdf_to_html("a.pdf", html_images="foo")
+
+class TestAdmission(unittest.TestCase):
+
+    def test_parse_memory(self):
+        from converter.admission import parse_memory
+        self.assertEqual(parse_memory("4G"), 4 * 1024 ** 3)
+        self.assertEqual(parse_memory("512"), 512 * 1024 ** 2)
+        with self.assertRaises(ValueError):
+            parse_memory("lots")
+
+    def test_budget_is_respected_and_big_jobs_are_not_starved(self):
+        from converter import admission
+
+        async def scenario():
+            gate = admission.MemoryAdmission(budget=100)
+            started = []
+
+            async def job(name, estimate, duration):
+                async with gate.reserve(estimate):
+                    started.append(name)
+                    self.assertLessEqual(gate.in_use, 100)
+                    await asyncio.sleep(duration)
+
+            with patch.object(admission, "MAX_BYPASS", 2):
+                # "big" waits behind "first"; two small jobs may overtake it, the third may not
+                await asyncio.gather(job("first", 60, 0.05), job("big", 90, 0.01),
+                                     *(job(f"small{i}", 10, 0.05) for i in range(3)))
+            return started
+
+        started = asyncio.run(scenario())
+        self.assertEqual(started, ["first", "small0", "small1", "big", "small2"])
+
+    def test_oversized_job_runs_alone(self):
+        from converter import admission
+
+        async def scenario():
+            gate = admission.MemoryAdmission(budget=100)
+            async with gate.reserve(500):
+                return gate.running
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+
+    def test_jobs_waiting_for_a_slot_hold_no_budget(self):
+        from converter import admission, async_converter
+        gates, seen = [], []
+
+        def gate(budget):
+            gates.append(admission.MemoryAdmission(budget))
+            return gates[-1]
+
+        async def convert(path, target_ext, **options):
+            seen.append(gates[0].in_use)
+            await asyncio.sleep(0.01)
+            return path
+
+        with patch.object(async_converter, "MemoryAdmission", gate), \
+                patch.object(async_converter, "_estimate", return_value=10), \
+                patch.object(async_converter, "convert_async", convert):
+            jobs = [(f"{i}.pdf", "png") for i in range(3)]
+            asyncio.run(async_converter.convert_jobs_async(jobs, limit=1, memory_budget=100))
+        self.assertEqual(seen, [10, 10, 10])
+
+class TestEstimate(unittest.TestCase):
+
+    def test_rates_are_learned_from_past_runs(self):
+        import tempfile
+        from converter import estimate
+        def pdf(pages):
+            return estimate.InputInfo("pdf", 0, pages, "pages", 0)
+        with tempfile.TemporaryDirectory() as root:
+            stats = estimate.ThroughputStats(os.path.join(root, "throughput.json"))
+            self.assertEqual(stats.predict(pdf(10), "png")[2], 0)  # Built-in rates
+            for pages in (1, 5, 10):
+                stats.add_run(pdf(pages), "png", 1 + 0.5 * pages, 1000 * pages)
+            stats.save()
+            seconds, out, runs = estimate.ThroughputStats(stats.path).predict(pdf(20), "png")
+        self.assertAlmostEqual(seconds, 11)
+        self.assertEqual((out, runs), (20000, 3))
+
+    def test_plan_follows_job_limit_and_budget(self):
+        from converter import estimate
+        info = estimate.InputInfo("pdf", 0, 1, "pages", 0)
+        jobs = [estimate.JobEstimate(f"{n}.pdf", "png", info, 10, 60, 0, 0) for n in range(3)]
+        self.assertEqual(estimate.plan_batch(jobs, limit=2, cores=4), (20, 120))
+        self.assertEqual(estimate.plan_batch(jobs, limit=2, memory_budget=100, cores=4), (30, 60))
+
+    def test_plan_shares_cores_between_running_jobs(self):
+        from converter import estimate
+        info = estimate.InputInfo("pdf", 0, 1, "pages", 0)
+        jobs = [estimate.JobEstimate(f"{n}.pdf", "png", info, 10, 0, 0, 0) for n in range(4)]
+        # More jobs than cores: no faster than the serial time spread over the cores
+        self.assertAlmostEqual(estimate.plan_batch(jobs, limit=4, cores=1)[0], 40)
+        self.assertAlmostEqual(estimate.plan_batch(jobs, limit=40, cores=2)[0], 20)
+        self.assertAlmostEqual(estimate.plan_batch(jobs, limit=4, cores=4)[0], 10)
+
+    def test_recorded_time_discounts_contention(self):
+        from converter import async_converter
+        now = [0.0]
+        with patch.object(async_converter.time, "perf_counter", lambda: now[0]):
+            clock = async_converter._ShareClock(cores=2)
+            first = clock.start()
+            now[0] = 1.0
+            second, third = clock.start(), clock.start()
+            now[0] = 4.0  # Three jobs on two cores for 3s: 2s each
+            self.assertAlmostEqual(clock.stop(second), 2.0)
+            self.assertAlmostEqual(clock.stop(third), 2.0)
+            now[0] = 5.0
+            self.assertAlmostEqual(clock.stop(first), 4.0)
+
+    def test_stats_path_can_be_overridden(self):
+        from converter import estimate
+        with patch.dict(os.environ, {"LITESWITCH_STATS_PATH": "/tmp/load/throughput.json"}):
+            self.assertEqual(estimate.ThroughputStats().path, "/tmp/load/throughput.json")
+
+class TestArchive(unittest.TestCase):
+
+    def test_pages_are_stored_uncompressed(self):
+        import tarfile
+        import tempfile
+        import zipfile
+        from converter import archive
+        with tempfile.TemporaryDirectory() as root:
+            zip_path = os.path.join(root, "pages.zip")
+            with archive.PageArchive(zip_path, "zip") as pages:
+                pages.add("page_1.png", b"one")
+                pages.add("page_2.png", b"two")
+            with zipfile.ZipFile(zip_path) as zf:
+                self.assertEqual(zf.namelist(), ["page_1.png", "page_2.png"])
+                self.assertEqual(zf.getinfo("page_2.png").compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(zf.read("page_2.png"), b"two")
+
+            slides = os.path.join(root, "slides")
+            os.makedirs(slides)
+            for n in (10, 2, 1):
+                with open(os.path.join(slides, f"Slide_{n}.png"), "wb") as f:
+                    f.write(str(n).encode())
+            tar_path = archive.pack_directory(slides, os.path.join(root, "slides.tar"), "tar")
+            with tarfile.open(tar_path) as tf:
+                self.assertEqual(tf.getnames(), ["Slide_1.png", "Slide_2.png", "Slide_10.png"])
+
+    def test_repeated_pages_are_linked(self):
+        import tarfile
+        import tempfile
+        from converter import archive
+        with tempfile.TemporaryDirectory() as root:
+            tar_path = os.path.join(root, "pages.tar")
+            with archive.PageArchive(tar_path, "tar") as pages:
+                pages.add("page_1.png", b"divider")
+                pages.add_link("page_2.png", "page_1.png")
+            with tarfile.open(tar_path) as tf:
+                self.assertTrue(tf.getmember("page_2.png").islnk())
+                self.assertEqual(tf.extractfile("page_2.png").read(), b"divider")
+
+            first = os.path.join(root, "page_1.png")
+            with open(first, "wb") as f:
+                f.write(b"divider")
+            second = scratch.publish_link(first, os.path.join(root, "page_2.png"))
+            with open(second, "rb") as f:
+                self.assertEqual(f.read(), b"divider")
+
+class TestPandocCache(unittest.TestCase):
+
+    def test_ast_key_and_pruning(self):
+        import tempfile
+        from converter import pandoc_cache
+        with tempfile.TemporaryDirectory() as root:
+            doc = os.path.join(root, "a.docx")
+            with open(doc, "wb") as f:
+                f.write(b"docx bytes")
+            path = pandoc_cache.ast_path(doc, "3.1", root)
+            self.assertEqual(path, pandoc_cache.ast_path(doc, "3.1", root))
+            self.assertNotEqual(path, pandoc_cache.ast_path(doc, "3.2", root))
+            self.assertFalse(pandoc_cache.lookup(path))
+
+            for i in range(3):
+                entry = os.path.join(root, f"{i}.json")
+                open(entry, "w").close()
+                os.utime(entry, (i, i))
+            pandoc_cache.prune(root, keep=2)
+            self.assertEqual(sorted(e for e in os.listdir(root) if e.endswith(".json")), ["1.json", "2.json"])
+
+    def test_text_targets_render_from_the_shared_ast(self):
+        pypandoc = MagicMock(get_pandoc_path=lambda: "pandoc")
+        with patch.dict(sys.modules, {"pypandoc": pypandoc}), \
+                patch.object(document_converter, "cached_pandoc_ast", return_value="/cache/a.json") as ast:
+            for target in ("md", "tex", "html", "txt"):
+                self.assertIn(target, document_converter.CONVERSION_MAP["docx"])
+                job = document_converter.EXTERNAL_JOB_MAP["docx"][target]("/docs/a.docx")
+                try:
+                    with job.prepare() as cmd:
+                        self.assertEqual(cmd[1], "--from=json")
+                        self.assertEqual(cmd[-1], "/cache/a.json")
+                finally:
+                    job.cleanup()
+        self.assertEqual(ast.call_count, 4)
+
+class TestBatchCollector(unittest.TestCase):
+
+    def test_one_process_per_file_becomes_one_batch(self):
+        """The first invocation leads; later ones hand over their file and exit."""
+        import tempfile
+        import threading
+        from converter import batch_collector
+        with tempfile.TemporaryDirectory() as root, \
+                patch.object(batch_collector, "SPOOL_ROOT", root), \
+                patch.object(batch_collector, "COLLECT_QUIET", 0.3):
+            results = {}
+
+            def invoke(name):
+                results[name] = batch_collector.collect_batch([name], "pdf")
+
+            leader = threading.Thread(target=invoke, args=("a.docx",))
+            leader.start()
+            time.sleep(0.1)
+            followers = [threading.Thread(target=invoke, args=(f"{n}.docx",)) for n in "bcd"]
+            for t in followers:
+                t.start()
+            for t in followers + [leader]:
+                t.join()
+
+        self.assertEqual(sorted(results["a.docx"]), ["a.docx", "b.docx", "c.docx", "d.docx"])
+        for n in "bcd":
+            self.assertIsNone(results[f"{n}.docx"])
+
+    def test_late_follower_does_not_lead_an_empty_batch(self):
+        """A follower whose entry the finishing leader already took hands over instead of leading."""
+        import tempfile
+        from converter import batch_collector
+        with tempfile.TemporaryDirectory() as root, patch.object(batch_collector, "SPOOL_ROOT", root):
+            batch_dir = batch_collector._batch_dir("pdf")
+            os.makedirs(batch_dir)
+            lock_path = os.path.join(batch_dir, "leader.lock")
+            open(lock_path, "w").close()
+            spool = batch_collector._spool
+
+            def leader_finishes(directory, paths):
+                # The entry lands, then the leader drains it and releases the lock
+                spool(directory, paths)
+                batch_collector._drain(directory)
+                os.remove(lock_path)
+
+            with patch.object(batch_collector, "_spool", leader_finishes):
+                self.assertIsNone(batch_collector.collect_batch(["late.docx"], "pdf"))
+            self.assertFalse(os.path.exists(lock_path))
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_percentiles_and_stub_office(self):
+        import tempfile
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import load_test
+        latencies = [float(n) for n in range(1, 101)]
+        self.assertEqual(load_test.percentile(latencies, 50), 50.0)
+        self.assertEqual(load_test.percentile(latencies, 99), 99.0)
+        self.assertEqual(load_test.percentile([3.0], 95), 3.0)
+
+        with tempfile.TemporaryDirectory() as root, patch.dict(os.environ, {"LITESWITCH_STUB_DELAY": "0"}):
+            docx = load_test.make_docx(os.path.join(root, "in.docx"), 3)
+            load_test.stub_office_main(["--headless", "--convert-to", "pdf", "--outdir", root, docx])
+            with open(os.path.join(root, "in.pdf"), "rb") as f:
+                self.assertTrue(f.read().startswith(b"%PDF-"))
+
 if __name__ == "__main__":
     unittest.main()